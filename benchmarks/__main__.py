@@ -0,0 +1,10 @@
+import os
+import sys
+
+# The root scripts import from the repository root, particle_sim's modules from particle_sim/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "particle_sim")]
+
+from benchmarks.run import cli
+
+sys.exit(cli())
@@ -0,0 +1,199 @@
+import numpy as np
+import galaxy_formation_density
+import galaxy_rotation
+import rotation_fit
+from modules.utils.calculations import Engine, pair_potential_moments, sampled_pair_potential
+from modules.utils.channels import StoichiometryMatrix
+from modules.utils.rng import BufferedRNG
+from modules.utils.spatial import neighbor_pairs
+from modules.utils.species import VACUUM_PROB
+
+# name -> (setup, {parameter: sizes}); setup(**case) returns (run, steps), where
+# run() advances the kernel by `steps` steps from the same starting state every call
+BENCHMARKS = {}
+
+
+def benchmark(name, **params):
+    """Register a setup function as benchmark `name` over the grid of parameter sizes."""
+    def register(setup):
+        BENCHMARKS[name] = (setup, params)
+        return setup
+    return register
+
+
+@benchmark("vacuum_energy", kinetics=["Tau-Leap", "Bernoulli"], steps=[100, 1000, 4000])
+def vacuum_energy(kinetics, steps):
+    """Engine.step from a fresh state; counts grow with the step count."""
+    engine = Engine()
+
+    def run():
+        state = engine.new_state("Default", 1, 2.7, seed=0)
+        for _ in range(steps):
+            engine.step(state, 0.1, kinetics)
+    return run, steps
+
+
+@benchmark("next_reaction", steps=[50, 100, 200])
+def next_reaction(steps):
+    """Next Reaction kinetics; interaction events grow with the square of the counts, so steps are few."""
+    return vacuum_energy("Next Reaction", steps)
+
+
+@benchmark("vacuum_fluctuations", fluctuations=[1, 64, 4096])
+def vacuum_fluctuations(fluctuations, steps=500):
+    """Engine.step with k creation/annihilation events per step (Tau-Leap)."""
+    engine = Engine()
+
+    def run():
+        state = engine.new_state("Default", 1, 2.7, seed=0)
+        for _ in range(steps):
+            engine.step(state, 0.1, "Tau-Leap", fluctuations)
+    return run, steps
+
+
+def synthetic_engine(n_species, n_channels, rng, branches=2):
+    """An Engine over random 2 -> 2 channels of n_species species, compiled like compile_interaction_channels."""
+    reactant_rows = rng.integers(n_species, size=(n_channels, 2)).tolist()
+    product_rows = rng.integers(n_species, size=(n_channels * branches, 2)).tolist()
+    branch_rows = np.arange(n_channels * branches, dtype=np.int64).reshape(n_channels, branches)
+    branch_probs = np.full((n_channels, branches), 1 / branches)
+    interactions = StoichiometryMatrix(reactant_rows, n_species), StoichiometryMatrix(product_rows, n_species), branch_rows, branch_probs
+    return Engine(interactions, decays=np.zeros(n_species, dtype=bool), zero_point_energy=np.zeros(n_species))
+
+
+@benchmark("handle_interactions", kinetics=["Tau-Leap", "Bernoulli"], species=[38, 500, 5000], channels=[50, 500, 5000])
+def handle_interactions(kinetics, species, channels, steps=200):
+    """Engine.handle_interactions on a synthetic network of the given size."""
+    rng = np.random.default_rng(0)
+    engine = synthetic_engine(species, channels, rng)
+    counts = rng.poisson(5, species).astype(np.int64)
+
+    def run():
+        state = engine.new_state("Default", 1, seed=0)
+        engine.apply_delta(state, counts)
+        for _ in range(steps):
+            engine.handle_interactions(state, 0.1, kinetics)
+    return run, steps
+
+
+@benchmark("neighbor_pairs", particles=[10_000, 100_000, 1_000_000])
+def neighbor_pairs_search(particles, steps=3):
+    """Cell-list pair search at one particle per interaction radius cubed."""
+    side = np.cbrt(particles) * 0.01
+    positions = np.random.default_rng(0).uniform(0, side, size=(particles, 3))
+
+    def run():
+        for _ in range(steps):
+            neighbor_pairs(positions, side, 0.01)
+    return run, steps
+
+
+@benchmark("spatial_step", particles=[10_000, 100_000, 1_000_000])
+def spatial_step(particles, steps=2):
+    """Engine.step in Spatial kinetics from vacuum-distributed particles at one per interaction radius cubed."""
+    engine = Engine()
+    counts = np.random.default_rng(0).multinomial(particles, VACUUM_PROB / VACUUM_PROB.sum())
+
+    def run():
+        state = engine.new_state("Default", particles * engine.interaction_radius ** 3, seed=0)
+        engine.apply_delta(state, counts)
+        for _ in range(steps):
+            engine.step(state, 0.1, "Spatial")
+    return run, steps
+
+
+@benchmark("gravitational_potential", species=[38, 10_000, 1_000_000])
+def gravitational_potential(species, steps=200):
+    """Closed-form pair potential moments over random masses and counts."""
+    rng = np.random.default_rng(0)
+    masses, counts = rng.random(species), rng.poisson(5, species).astype(np.int64)
+
+    def run():
+        for _ in range(steps):
+            pair_potential_moments(masses, counts)
+    return run, steps
+
+
+@benchmark("gravitational_potential_monte_carlo", species=[10, 38, 200])
+def gravitational_potential_monte_carlo(species, steps=50, samples=64):
+    """Monte Carlo pair potential: every pair distance of `samples` realizations."""
+    rng = np.random.default_rng(0)
+    masses, counts = rng.random(species), rng.poisson(5, species).astype(np.int64) + 1
+
+    def run():
+        sampler = BufferedRNG(0)
+        for _ in range(steps):
+            sampled_pair_potential(masses, counts, samples, sampler)
+    return run, steps
+
+
+@benchmark("galaxy_rotation", radii=[10, 1000, 1_000_000])
+def galaxy_rotation_curve(radii, steps=50):
+    """Steps of the simulate_galaxy_rotation generator on a radius grid of the given size (profiles integrated in setup)."""
+    radius = np.linspace(1, 10, radii)
+    stellar_population = {"Population 1": {"formation_rate": 0.001}, "Population 2": {"formation_rate": 0.002}}
+    enclosed_mass = galaxy_rotation.EnclosedMass(radius)
+
+    def run():
+        stellar_mass = {name: np.zeros_like(radius) for name in stellar_population}
+        simulation = galaxy_rotation.simulate_galaxy_rotation(radius, 1e12, 5, 1e9, galaxy_rotation.gas_density_profile,
+                                                              1, 1e10, stellar_population, 1e10, stellar_mass, enclosed_mass)
+        for _ in range(steps):
+            next(simulation)
+    return run, steps
+
+
+@benchmark("galaxy_rotation_at", times=[1000, 10_000, 100_000])
+def galaxy_rotation_at(times, radii=1000):
+    """galaxy_rotation_at over an array of step indices up to 10^6, one step per curve (profiles integrated in setup)."""
+    radius = np.linspace(1, 10, radii)
+    stellar_population = {"Population 1": {"formation_rate": 0.001}, "Population 2": {"formation_rate": 0.002}}
+    stellar_mass = {name: np.zeros_like(radius) for name in stellar_population}
+    enclosed_mass = galaxy_rotation.EnclosedMass(radius)
+    steps = np.linspace(0, 1_000_000, times).round()
+
+    def run():
+        galaxy_rotation.galaxy_rotation_at(steps, radius, 1e12, 5, 1e9, galaxy_rotation.gas_density_profile,
+                                           1, 1e10, stellar_population, 1e10, stellar_mass, enclosed_mass)
+    return run, times
+
+
+@benchmark("rotation_sweep", curves=[1000, 10_000, 100_000])
+def rotation_sweep(curves, radii=200):
+    """sweep_rotation_curves over a grid of halo parameters, one curve per step."""
+    radius = np.linspace(0.1, 30, radii)
+    n = round(np.cbrt(curves))
+    scale_radius, rho_0, initial_mass = galaxy_rotation.parameter_grid(np.linspace(1, 20, n), np.geomspace(1e7, 1e10, n),
+                                                                       np.geomspace(1e10, 1e13, -(-curves // (n * n))))
+    baryon_mass = galaxy_rotation.EnclosedMass(radius).distributed(1e10, galaxy_rotation.gas_density_profile)
+
+    def run():
+        galaxy_rotation.sweep_rotation_curves(radius, scale_radius[:curves], rho_0[:curves], initial_mass[:curves], baryon_mass)
+    return run, curves
+
+
+@benchmark("rotation_fit", points=[20, 100, 1000])
+def rotation_fit_kernel(points, fits=4):
+    """RotationCurveFit.fit (grid search and Nelder-Mead) on noisy synthetic curves, one fit per step."""
+    rng = np.random.default_rng(0)
+    radius = np.linspace(0.5, 30, points)
+    truth = galaxy_rotation.rotation_curve_matrix(radius, np.geomspace(2, 15, fits), np.geomspace(1e7, 1e9, fits), np.geomspace(1e10, 1e11, fits))
+    sigma = 0.05 * truth + 0.01 * truth.max(axis=1, keepdims=True)  # 5% errors with a floor of 1% of the curve's peak
+    velocity = truth + sigma * rng.standard_normal(truth.shape)
+
+    def run():
+        for curve, error in zip(velocity, sigma):
+            rotation_fit.RotationCurveFit(radius, curve, error).fit()
+    return run, fits
+
+
+@benchmark("galaxy_formation", steps=[1000, 10_000, 100_000])
+def galaxy_formation(steps):
+    """simulate_galaxy_formation_and_density advanced step by step from the script's initial state."""
+    def run():
+        total_mass, stellar_mass, black_hole_mass, gas_mass, dark_matter_mass = 0.0, 0.0, 0.0, 1e11, 1e12
+        for time_step in range(steps):
+            (_, _, _, _, total_mass, stellar_mass, black_hole_mass, gas_mass,
+             dark_matter_mass) = galaxy_formation_density.simulate_galaxy_formation_and_density(
+                time_step, total_mass, stellar_mass, black_hole_mass, gas_mass, dark_matter_mass, 0.01)
+    return run, steps
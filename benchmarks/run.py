@@ -0,0 +1,159 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import time
+import tracemalloc
+import numpy as np
+from benchmarks.kernels import BENCHMARKS
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS = os.path.join(HERE, "results.json")
+BASELINE = os.path.join(HERE, "baseline.json")  # Machine specific, so never committed; the first run writes it
+SETUP_KEYS = ("node", "python", "numpy", "machine", "processor", "cpus")  # Timings are only comparable when these match
+
+
+def cases(names=None, quick=False):
+    """Yield (name, key, case) for every benchmark and point of its parameter grid.
+
+    quick keeps only the smallest size of each parameter.
+    """
+    for name, (setup, params) in BENCHMARKS.items():
+        if names and not any(pattern in name for pattern in names):
+            continue
+        grid = [values[:1] if quick else values for values in params.values()]
+        for values in itertools.product(*grid):
+            case = dict(zip(params, values))
+            yield name, name + "[" + ",".join(f"{k}={v}" for k, v in case.items()) + "]", case
+
+
+def measure(setup, case, repeat=3):
+    """Time one benchmark case; returns steps/s (best of `repeat` runs) and the peak traced memory.
+
+    Memory is measured in a separate traced run (setup included) so tracemalloc's
+    overhead does not leak into the timings.
+    """
+    run, steps = setup(**case)
+    run()  # Warm up caches and lazily built engine state
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        traced_run, _ = setup(**case)
+        traced_run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    best = min(times)
+    return {
+        "steps": steps,
+        "seconds": best,
+        "steps_per_second": steps / best if best > 0 else float("inf"),
+        "seconds_median": float(np.median(times)),
+        "peak_memory_bytes": peak,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Return [(key, metric, baseline, current)] for every case that regressed beyond threshold.
+
+    Throughput regresses when steps/s falls below (1 - threshold) of the baseline;
+    memory when the peak exceeds (1 + threshold) of it. Cases missing from either
+    side are ignored.
+    """
+    regressions = []
+    for key, current in results.items():
+        old = baseline.get(key)
+        if old is None:
+            continue
+        if current["steps_per_second"] < old["steps_per_second"] * (1 - threshold):
+            regressions.append((key, "steps_per_second", old["steps_per_second"], current["steps_per_second"]))
+        if current["peak_memory_bytes"] > old["peak_memory_bytes"] * (1 + threshold):
+            regressions.append((key, "peak_memory_bytes", old["peak_memory_bytes"], current["peak_memory_bytes"]))
+    return regressions
+
+
+def environment():
+    return {
+        "node": platform.node(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def setup_changes(baseline_environment, current_environment):
+    """Return ["key: baseline -> current"] for every SETUP_KEYS entry that differs between two environments."""
+    return [f"{key}: {baseline_environment.get(key)} -> {current_environment.get(key)}"
+            for key in SETUP_KEYS if baseline_environment.get(key) != current_environment.get(key)]
+
+
+def write_document(path, document):
+    with open(path, "w") as f:
+        json.dump(document, f, indent=2)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Time the simulator's hot paths at several sizes and compare against a baseline.")
+    parser.add_argument("names", nargs="*", help="only run benchmarks whose name contains one of these")
+    parser.add_argument("--list", action="store_true", help="list the benchmark cases and exit")
+    parser.add_argument("--quick", action="store_true", help="only the smallest size of every parameter")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case (the best one counts)")
+    parser.add_argument("--output", default=RESULTS, help="JSON results file")
+    parser.add_argument("--baseline", default=BASELINE, help="JSON results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="relative change counted as a regression")
+    parser.add_argument("--save-baseline", action="store_true", help="also write the results to --baseline (done automatically when there is none)")
+    return parser.parse_args(argv)
+
+
+def cli(argv=None):
+    args = parse_args(argv)
+    selected = list(cases(args.names, args.quick))
+    if args.list:
+        for _, key, _ in selected:
+            print(key)
+        return 0
+
+    results = {}
+    for name, key, case in selected:
+        result = measure(BENCHMARKS[name][0], case, args.repeat)
+        results[key] = result
+        print(f"{key:<72} {result['steps_per_second']:>14,.1f} steps/s {result['peak_memory_bytes'] / 1024:>10.1f} KiB", flush=True)
+
+    document = {"environment": environment(), "results": results}
+    write_document(args.output, document)
+    print(f"Results written to {args.output}")
+    if args.save_baseline or not os.path.exists(args.baseline):
+        write_document(args.baseline, document)
+        print(f"Baseline for this machine written to {args.baseline}")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    changes = setup_changes(baseline["environment"], document["environment"])
+    if changes:
+        # Absolute timings from another machine or numpy would report noise as regressions
+        print(f"Not compared: {args.baseline} was recorded on a different setup ({'; '.join(changes)}); "
+              "run with --save-baseline to record one here")
+        return 0
+    regressions = compare(results, baseline["results"], args.threshold)
+    added = [key for key in results if key not in baseline["results"]]
+    if added:
+        # Cases first run on this machine (e.g. after a partial first run) start their baseline now
+        baseline["results"].update((key, results[key]) for key in added)
+        write_document(args.baseline, baseline)
+        print(f"{len(added)} new cases added to {args.baseline}")
+    for key, metric, old, new in regressions:
+        print(f"REGRESSION {key} {metric}: {old:,.1f} -> {new:,.1f} ({new / old - 1:+.0%})")
+    if not regressions:
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return 1 if regressions else 0
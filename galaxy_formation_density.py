@@ -1,6 +1,7 @@
 import numpy as np
 import curses
 import time
+from particle_sim.modules.display.renderer import FrameRenderer
 
 # Constants
 H_0 = 70  # Hubble constant (km/s/Mpc)
@@ -53,6 +54,7 @@ def display_galaxy_formation_and_density(stdscr):
     time_delay = 0.1  # Time step delay (seconds)
 
     curses.curs_set(0)  # Hide the cursor
+    renderer = FrameRenderer(stdscr, fps=20)
 
     while True:
         # Simulate data
@@ -81,34 +83,35 @@ def display_galaxy_formation_and_density(stdscr):
         avg_galaxy_formation_rate = (avg_galaxy_formation_rate * time_step + galaxy_formation_rate) / (time_step + 1)
         avg_mass_density = (avg_mass_density * time_step + mass_density) / (time_step + 1)
 
-        # Clear screen
-        stdscr.clear()
+        # Redraw at most fps times per second, writing only the rows that changed
+        if renderer.due():
+            renderer.begin()
 
-        # Print headers
-        stdscr.addstr(0, 0, f"Time Step: {time_step}")
-        stdscr.addstr(1, 0, f"{'Time (Gyr)':>12} | {'Inflation Factor':>20} | {'Galaxy Formation Rate (kg)':>25} | {'Mass Density (kg/m^3)':>25}")
-        stdscr.addstr(2, 0, "-" * 90)
+            # Print headers
+            renderer.line(0, f"Time Step: {time_step}")
+            renderer.line(1, f"{'Time (Gyr)':>12} | {'Inflation Factor':>20} | {'Galaxy Formation Rate (kg)':>25} | {'Mass Density (kg/m^3)':>25}")
+            renderer.line(2, "-" * 90)
 
-        # Print current values
-        stdscr.addstr(3, 0, f"{t:12.4f} | {inflation:20.2e} | {galaxy_formation_rate:25.2e} | {mass_density:25.2e}")
+            # Print current values
+            renderer.line(3, f"{t:12.4f} | {inflation:20.2e} | {galaxy_formation_rate:25.2e} | {mass_density:25.2e}")
 
-        # Print average values
-        stdscr.addstr(5, 0, "Average Values:")
-        stdscr.addstr(6, 0, f"{'':>12} | {avg_inflation:20.2e} | {avg_galaxy_formation_rate:25.2e} | {avg_mass_density:25.2e}")
+            # Print average values
+            renderer.line(5, "Average Values:")
+            renderer.line(6, f"{'':>12} | {avg_inflation:20.2e} | {avg_galaxy_formation_rate:25.2e} | {avg_mass_density:25.2e}")
 
-        # Print mass information
-        stdscr.addstr(8, 0, "Mass Information:")
-        stdscr.addstr(9, 0, f"Total Mass: {total_mass:.2e} kg")
-        stdscr.addstr(10, 0, f"Stellar Mass: {stellar_mass:.2e} kg")
-        stdscr.addstr(11, 0, f"Black Hole Mass: {black_hole_mass:.2e} kg")
-        stdscr.addstr(12, 0, f"Gas Mass: {gas_mass:.2e} kg")
-        stdscr.addstr(13, 0, f"Dark Matter Mass: {dark_matter_mass:.2e} kg")
+            # Print mass information
+            renderer.line(8, "Mass Information:")
+            renderer.line(9, f"Total Mass: {total_mass:.2e} kg")
+            renderer.line(10, f"Stellar Mass: {stellar_mass:.2e} kg")
+            renderer.line(11, f"Black Hole Mass: {black_hole_mass:.2e} kg")
+            renderer.line(12, f"Gas Mass: {gas_mass:.2e} kg")
+            renderer.line(13, f"Dark Matter Mass: {dark_matter_mass:.2e} kg")
 
-        # Display controls
-        stdscr.addstr(15, 0, "Controls: [UP] Increase SFR  [DOWN] Decrease SFR  [LEFT] Slow Down  [RIGHT] Speed Up  [Q] Quit")
+            # Display controls
+            renderer.line(15, "Controls: [UP] Increase SFR  [DOWN] Decrease SFR  [LEFT] Slow Down  [RIGHT] Speed Up  [Q] Quit")
 
-        # Refresh the screen
-        stdscr.refresh()
+            # Refresh the screen
+            renderer.present()
 
         # Handle input
         stdscr.nodelay(True)
@@ -1,14 +1,16 @@
 import numpy as np
 import time
 import os
+from concurrent.futures import ProcessPoolExecutor
 
 # Constants
 G = 6.67430e-11  # gravitational constant (m^3 kg^-1 s^-2)
 
-# Define the NFW dark matter density profile
+# Define the NFW dark matter density profile (radius may be a scalar or an array)
 def nfw_density_profile(radius, scale_radius, rho_0):
-    x = radius / scale_radius
-    return rho_0 / (x * (1 + x)**2) if x > 0 else rho_0
+    x = np.asarray(radius, dtype=float) / scale_radius
+    safe_x = np.where(x > 0, x, 1.0)  # Keeps the unused branch of np.where finite
+    return np.where(x > 0, rho_0 / (safe_x * (1 + safe_x)**2), rho_0)[()]
 
 # Function to calculate gravitational potential due to dark matter
 def dark_matter_potential(radius, scale_radius, rho_0):
@@ -17,48 +19,252 @@ def dark_matter_potential(radius, scale_radius, rho_0):
     )
     return potential
 
-# Function to calculate rotational velocity due to dark matter
+# NFW halo mass within each radius in closed form (the integral of nfw_density_profile; broadcasts)
+def nfw_enclosed_mass(radius, scale_radius, rho_0):
+    x = radius / scale_radius
+    return 4 * np.pi * rho_0 * scale_radius**3 * (np.log1p(x) - x / (1 + x))
+
+# Function to calculate rotational velocity due to dark matter: sqrt(G M_nfw(<r) / r), the halo term of every rotation curve here
 def rotational_velocity_dark_matter(radius, scale_radius, rho_0):
-    potential = dark_matter_potential(radius, scale_radius, rho_0)
-    velocity = np.sqrt(-potential / radius) if radius > 0 else 0
-    return velocity
+    radius = np.asarray(radius, dtype=float)
+    return rotational_velocity_newton(radius, nfw_enclosed_mass(radius, scale_radius, rho_0))
 
-# Function to calculate rotational velocity using Newtonian gravity
+# Function to calculate rotational velocity using Newtonian gravity (mass may be one value per radius)
 def rotational_velocity_newton(radius, mass):
-    return np.sqrt(G * mass / radius) if radius > 0 else 0
+    radius = np.asarray(radius, dtype=float)
+    safe_radius = np.where(radius > 0, radius, 1.0)
+    return np.where(radius > 0, np.sqrt(G * mass / safe_radius), 0.0)[()]
 
 # Gas density profile function
 def gas_density_profile(radius):
     return 1e8 / (radius + 1)
 
+# Default stellar density profile of a population (exponential, scale length in kpc)
+def stellar_density_profile(radius, scale_length=3.0):
+    return np.exp(-radius / scale_length)
+
+# Mass within each radius of a spherical density profile, integrated from r = 0
+def enclosed_mass_profile(radius, density, min_panels=4096):
+    """Cumulative Simpson sums of 4 pi r^2 density(r) over the intervals [0, r_0], [r_0, r_1], ...
+
+    radius must be increasing. Intervals wider than 1/min_panels of the outer
+    radius (a coarse grid, or the gap between r = 0 and the first radius) are
+    split evenly into several Simpson panels, so the cost is O(N + min_panels).
+    density(r) may return extra leading axes (e.g. one row per parameter set),
+    which are kept.
+    """
+    radius = np.asarray(radius, dtype=float)
+    if np.any(np.diff(radius) < 0):
+        raise ValueError("radius must be increasing to integrate enclosed masses")
+    edges = np.concatenate([[0.0], radius])
+    widths = np.diff(edges)
+    panels = np.maximum(np.ceil(widths * (min_panels / edges[-1] if edges[-1] > 0 else 0)), 1).astype(np.int64)
+    steps = np.repeat(widths / panels, panels)
+    within = np.arange(steps.size) - np.repeat(np.cumsum(panels) - panels, panels)  # Panel index within its interval
+    edges = np.append(np.repeat(edges[:-1], panels) + steps * within, edges[-1])
+    points = np.empty(2 * edges.size - 1)
+    points[0::2] = edges
+    points[1::2] = (edges[:-1] + edges[1:]) / 2  # Panel midpoints
+    integrand = 4 * np.pi * points**2 * density(points)
+    panel_masses = (integrand[..., :-2:2] + 4 * integrand[..., 1::2] + integrand[..., 2::2]) * steps / 6
+    return np.cumsum(panel_masses, axis=-1)[..., np.cumsum(panels) - 1]
+
+class EnclosedMass:
+    """Cache of enclosed-mass tables M(<r) on one radius grid.
+
+    Each profile shape is integrated once with enclosed_mass_profile() and kept,
+    keyed by the density function and its shape parameters. Only normalisations
+    change while a galaxy evolves (rho_0, the gas mass, the mass of each stellar
+    population), so a time step multiplies a cached table instead of integrating.
+    """
+
+    def __init__(self, radius):
+        self.radius = np.asarray(radius, dtype=float)
+        self.tables = {}
+        self.fractions = {}
+
+    def table(self, density, *shape):
+        """M(<r) of density(r, *shape), integrated on first use."""
+        key = (density, shape)
+        if key not in self.tables:
+            self.tables[key] = enclosed_mass_profile(self.radius, lambda r: density(r, *shape))
+        return self.tables[key]
+
+    def fraction(self, density, *shape):
+        """Share of the mass within the outer radius that lies within each radius."""
+        key = (density, shape)
+        if key not in self.fractions:
+            table = self.table(density, *shape)
+            self.fractions[key] = table / table[-1]
+        return self.fractions[key]
+
+    def dark_matter(self, scale_radius, rho_0):
+        """NFW halo mass within each radius; the table is per scale radius and scaled by rho_0."""
+        return rho_0 * self.table(nfw_density_profile, scale_radius, 1.0)
+
+    def distributed(self, mass, density, *shape):
+        """Enclosed masses of `mass` spread over the grid following density(r, *shape)."""
+        return mass * self.fraction(density, *shape)
+
+# Density profile of a stellar population: its 'density_profile' entry or the default exponential
+def population_density_profile(properties):
+    return properties.get('density_profile', stellar_density_profile)
+
+# Masses after `steps` time steps (a step index or an array of them) in closed form: every update is linear in the step
+def galaxy_rotation_state(steps, initial_mass, time_step, mass_change_rate, stellar_population, gas_mass):
+    """(current_mass, gas_mass, formed) after each of `steps` updates of simulate_galaxy_rotation.
+
+    Each step adds mass_change_rate * time_step to the central and the gas mass
+    and moves formation_rate * time_step of gas into every stellar population,
+    so after k steps the totals are the initial values plus k increments.
+    formed[name] is the stellar mass a population gained in those steps. The
+    populations are taken as fixed over the steps.
+    """
+    steps = np.asarray(steps, dtype=float)
+    formation = {name: properties['formation_rate'] * time_step for name, properties in stellar_population.items()}
+    current_mass = initial_mass + steps * (mass_change_rate * time_step)
+    gas_mass = gas_mass + steps * (mass_change_rate * time_step - sum(formation.values()))
+    return current_mass, gas_mass, {name: steps * change for name, change in formation.items()}
+
+# Enclosed mass of the simulated galaxy at step 0 and its growth per time step
+def galaxy_mass_growth(radius, initial_mass, dark_matter_scale_radius, dark_matter_rho_0, gas_density_profile, time_step, mass_change_rate, stellar_population, gas_mass, stellar_mass, enclosed_mass=None):
+    """(M_0, dM) over the radius grid, so that M(<r) after k steps is M_0 + k dM.
+
+    Takes the arguments of simulate_galaxy_rotation, with stellar_mass as the
+    enclosed masses at step 0. dM is the accretion onto the centre and the
+    gas, less the gas turned into stars, plus the stars following each
+    population's density profile.
+    """
+    enclosed_mass = enclosed_mass or EnclosedMass(radius)
+    gas_fraction = enclosed_mass.fraction(gas_density_profile)
+    mass = initial_mass + enclosed_mass.dark_matter(dark_matter_scale_radius, dark_matter_rho_0) + gas_mass * gas_fraction + sum(stellar_mass.values())
+    growth = mass_change_rate * time_step * (1 + gas_fraction)
+    for name, properties in stellar_population.items():
+        growth = growth + properties['formation_rate'] * time_step * (enclosed_mass.fraction(population_density_profile(properties)) - gas_fraction)
+    return mass, growth
+
+# Velocities sqrt(G M / r) of enclosed masses with the radius along the last axis, computed in place in `mass`
+def circular_velocities(radius, mass):
+    mass *= G
+    np.divide(mass, radius, out=mass, where=radius > 0)
+    mass[..., radius <= 0] = 0.0
+    return np.sqrt(mass, out=mass)
+
+# Rotation curves at arbitrary time steps in one vectorized call, without stepping the simulation
+def galaxy_rotation_at(steps, radius, initial_mass, dark_matter_scale_radius, dark_matter_rho_0, gas_density_profile, time_step, mass_change_rate, stellar_population, gas_mass, stellar_mass, enclosed_mass=None, out=None):
+    """The velocities simulate_galaxy_rotation yields at step index `steps`.
+
+    Takes the generator's arguments, with stellar_mass as the enclosed masses
+    at step 0. Every mass grows linearly in the step, so M(<r) at step k is
+    M_0 + k dM (galaxy_mass_growth()) and an array of n step indices gives an
+    (n, n_radii) matrix from one outer product, built in place (in `out` if
+    given) without temporaries of its size. A single step gives one curve.
+    """
+    radius = np.asarray(radius, dtype=float)
+    mass, growth = galaxy_mass_growth(radius, initial_mass, dark_matter_scale_radius, dark_matter_rho_0, gas_density_profile, time_step, mass_change_rate, stellar_population, gas_mass, stellar_mass, enclosed_mass)
+    velocities = np.multiply.outer(np.asarray(steps, dtype=float), growth, out=out)
+    velocities += mass
+    return circular_velocities(radius, velocities)
+
 # Function to simulate rotation of a galaxy including dark matter, dynamical mass variation, gas dynamics, and multiple stellar populations
-def simulate_galaxy_rotation(radius, initial_mass, dark_matter_scale_radius, dark_matter_rho_0, gas_density_profile, time_step, mass_change_rate, stellar_population, gas_mass, stellar_mass):
-    current_mass = initial_mass
+def simulate_galaxy_rotation(radius, initial_mass, dark_matter_scale_radius, dark_matter_rho_0, gas_density_profile, time_step, mass_change_rate, stellar_population, gas_mass, stellar_mass, enclosed_mass=None):
+    """Yield the circular velocities sqrt(G M(<r) / r) on the radius grid, one array per time step.
+
+    M(<r) is the central mass (initial_mass plus accretion, felt at every radius),
+    the NFW halo mass within r, the gas mass spread like gas_density_profile and
+    stellar_mass[name], which holds the enclosed mass of each population and
+    grows by its formation following the population's density profile. The
+    masses are linear in the step (see galaxy_rotation_at(), which jumps to any
+    step directly), so this generator only walks M_0 + k dM for the display and
+    keeps stellar_mass at the current step. The profile integrals come from
+    `enclosed_mass` (an EnclosedMass on `radius`, created if not given).
+    """
+    radius = np.asarray(radius, dtype=float)
+    enclosed_mass = enclosed_mass or EnclosedMass(radius)
+    mass, growth = galaxy_mass_growth(radius, initial_mass, dark_matter_scale_radius, dark_matter_rho_0, gas_density_profile, time_step, mass_change_rate, stellar_population, gas_mass, stellar_mass, enclosed_mass)
+    step = 0
     while True:
-        # Calculate velocities
-        newtonian_velocities = np.array([
-            rotational_velocity_newton(r, current_mass + gas_mass + np.sum([m[i] for m in stellar_mass.values()]))
-            for i, r in enumerate(radius)
-        ])
-        dark_matter_velocities = np.array([
-            rotational_velocity_dark_matter(r, dark_matter_scale_radius, dark_matter_rho_0) for r in radius
-        ])
-        total_velocities = np.sqrt(newtonian_velocities**2 + dark_matter_velocities**2)
-
-        yield total_velocities
-
-        # Update mass for the next time step
-        gas_mass += mass_change_rate * time_step  # Gas accretion rate
-        star_formation_rate = 0.01 * gas_mass  # Star formation efficiency
+        yield circular_velocities(radius, step * growth + mass)
+
+        # Move the stellar masses on to the next time step
+        step += 1
         for name, properties in stellar_population.items():
-            stellar_mass_change = properties['formation_rate'] * time_step
-            stellar_mass[name] += stellar_mass_change  # Increase in stellar mass
-            gas_mass -= stellar_mass_change  # Deplete gas mass
-        current_mass += mass_change_rate * time_step  # Increase in total mass
+            stellar_mass[name] += enclosed_mass.distributed(properties['formation_rate'] * time_step, population_density_profile(properties))
+
+# Flat arrays of every combination of the given halo parameter values, ready for a sweep
+def parameter_grid(scale_radius, rho_0, initial_mass):
+    return tuple(grid.ravel() for grid in np.meshgrid(scale_radius, rho_0, initial_mass, indexing="ij"))
+
+# Rotation curves of many parameter sets in one broadcast evaluation
+def rotation_curve_matrix(radius, scale_radius, rho_0, initial_mass, baryon_mass=0.0, out=None):
+    """Velocities sqrt(G M(<r) / r) as an (n_params, n_radii) matrix.
+
+    M(<r) is the central initial_mass, the NFW halo (closed form) and
+    baryon_mass, the enclosed mass of a fixed gas and star profile per radius
+    (e.g. EnclosedMass(radius).distributed(gas_mass, gas_density_profile)).
+    The parameters are broadcast to one value per row. The matrix is built in
+    place, in `out` if given, with one extra temporary of its size.
+    """
+    radius = np.asarray(radius, dtype=float)
+    scale_radius, rho_0, initial_mass = (p[:, None] for p in np.broadcast_arrays(*np.atleast_1d(scale_radius, rho_0, initial_mass)))
+    x = radius / scale_radius
+    mass = np.log1p(x, out=out)
+    x /= x + 1
+    mass -= x
+    mass *= 4 * np.pi * rho_0 * scale_radius**3
+    mass += initial_mass
+    mass += baryon_mass
+    return circular_velocities(radius, mass)
+
+# Worker of sweep_rotation_curves: one chunk of rows, written to the output file when there is one
+def sweep_chunk(task):
+    start, radius, scale_radius, rho_0, initial_mass, baryon_mass, output = task
+    if output is None:
+        return rotation_curve_matrix(radius, scale_radius, rho_0, initial_mass, baryon_mass)
+    velocities = np.load(output, mmap_mode="r+")
+    rotation_curve_matrix(radius, scale_radius, rho_0, initial_mass, baryon_mass, out=velocities[start:start + len(scale_radius)])
+    velocities.flush()
+
+# Rotation curves of arbitrarily many parameter sets, chunked and optionally spread over processes
+def sweep_rotation_curves(radius, scale_radius, rho_0, initial_mass, baryon_mass=0.0, output=None, chunk_bytes=64 * 2**20, workers=1):
+    """The rotation_curve_matrix() of every parameter set, computed `chunk_bytes` of rows at a time.
+
+    The parameter arrays are broadcast to n_params (see parameter_grid() for
+    every combination). With `output` (an .npy path) the matrix is created with
+    np.lib.format.open_memmap and returned memory-mapped, so a sweep of 10^7
+    curves never has to fit in RAM; otherwise it is returned as an array.
+    workers > 1 hands the chunks to a process pool, whose workers write their
+    rows straight into the output file.
+    """
+    radius = np.asarray(radius, dtype=float)
+    scale_radius, rho_0, initial_mass = (np.ascontiguousarray(p, dtype=float) for p in np.broadcast_arrays(*np.atleast_1d(scale_radius, rho_0, initial_mass)))
+    n_params = scale_radius.size
+    rows = max(1, chunk_bytes // (8 * max(radius.size, 1)))
+    if output is None:
+        velocities = np.empty((n_params, radius.size))
+    else:
+        velocities = np.lib.format.open_memmap(output, mode="w+", dtype=np.float64, shape=(n_params, radius.size))
+        velocities.flush()
+
+    tasks = [(start, radius, scale_radius[start:start + rows], rho_0[start:start + rows], initial_mass[start:start + rows], baryon_mass, output)
+             for start in range(0, n_params, rows)]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for (start, *_), chunk in zip(tasks, pool.map(sweep_chunk, tasks)):
+                if chunk is not None:
+                    velocities[start:start + len(chunk)] = chunk
+    else:
+        for start, _, *parameters, _, _ in tasks:
+            rotation_curve_matrix(radius, *parameters, baryon_mass, out=velocities[start:start + len(parameters[0])])
+    if output is not None:
+        velocities.flush()
+    return velocities
 
 # Function to display galaxy rotation including details for each factor
 def display_galaxy_rotation(radius, initial_mass, dark_matter_scale_radius, dark_matter_rho_0, gas_density_profile_name, time_step, mass_change_rate, stellar_population, gas_mass, stellar_mass):
-    simulation = simulate_galaxy_rotation(radius, initial_mass, dark_matter_scale_radius, dark_matter_rho_0, gas_density_profile, time_step, mass_change_rate, stellar_population, gas_mass, stellar_mass)
+    enclosed_mass = EnclosedMass(radius)
+    simulation = simulate_galaxy_rotation(radius, initial_mass, dark_matter_scale_radius, dark_matter_rho_0, gas_density_profile, time_step, mass_change_rate, stellar_population, gas_mass, stellar_mass, enclosed_mass)
+    dark_matter_velocities = rotational_velocity_dark_matter(radius, dark_matter_scale_radius, dark_matter_rho_0)
     t = 0
     while True:
         total_velocities = next(simulation)
@@ -66,7 +272,7 @@ def display_galaxy_rotation(radius, initial_mass, dark_matter_scale_radius, dark
         print(f"Time Step: {t}")
         print("Radius (kpc) | Dark Matter Velocity (km/s) | Total Velocity (km/s)")
         print("-" * 60)
-        for r, v_dm, v_total in zip(radius, [rotational_velocity_dark_matter(r, dark_matter_scale_radius, dark_matter_rho_0) for r in radius], total_velocities):
+        for r, v_dm, v_total in zip(radius, dark_matter_velocities, total_velocities):
             print(f"{r:10.2f} | {v_dm:25.2f} | {v_total:25.2f}")
         print("\nAdditional Information:")
         print(f"Dark Matter Scale Radius: {dark_matter_scale_radius} kpc")
@@ -78,8 +284,9 @@ def display_galaxy_rotation(radius, initial_mass, dark_matter_scale_radius, dark
         for name, properties in stellar_population.items():
             print(f"- {name}:")
             print(f"  - Star Formation Rate: {properties['formation_rate']} (arbitrary units)")
-            print(f"  - Mass: {np.sum(stellar_mass[name]):.2e} kg")
-        print(f"Total Galaxy Mass: {initial_mass + gas_mass + np.sum([np.sum(m) for m in stellar_mass.values()]):.2e} kg")
+            print(f"  - Mass: {stellar_mass[name][-1]:.2e} kg")  # Enclosed within the outer radius
+        current_mass, current_gas_mass, _ = galaxy_rotation_state(t, initial_mass, time_step, mass_change_rate, stellar_population, gas_mass)
+        print(f"Total Galaxy Mass: {current_mass + current_gas_mass + sum(m[-1] for m in stellar_mass.values()):.2e} kg")
         time.sleep(0.1)  # Adjust sleep time as needed
         t += 1
 
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# particle_sim's modules are imported relative to this directory (as when running main.py)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from main import cli
+
+cli()
@@ -1,10 +1,104 @@
+import argparse
 import curses
+import functools
+from modules.constants import KINETICS, time_delay, timestep_multiplier
 from modules.display.display import display_simulation
+from modules.runner.headless import run_headless
+from modules.runner.ensemble import run_ensemble
+from modules.utils.calculations import Engine
+from modules.utils.checkpoint import load_checkpoint
+from modules.utils.recorder import TimeSeriesRecorder
+from modules.utils.profiling import parse_step_window
+from modules.utils.table_cache import CACHE_DIR, cache_path, dictionary_hash, load_tables
 
-def main(stdscr):
+def main(stdscr, checkpoint=None, checkpoint_interval=60, recorder=None, fps=20, free_run=False,
+         kinetics=KINETICS, engine=None, state=None, step=0, timestep_multiplier=timestep_multiplier, time_delay=time_delay):
     curses.curs_set(0)
-    while True:
-        display_simulation(stdscr)
+    display_simulation(stdscr, checkpoint, checkpoint_interval, recorder, fps, free_run, kinetics, engine, state, step,
+                       timestep_multiplier, time_delay)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Vacuum energy particle simulation. Without a command the curses display is started.")
+    parser.add_argument("--checkpoint", default=None, help="checkpoint file (.npz) saved periodically and on quit")
+    parser.add_argument("--checkpoint-interval", type=float, default=60, help="seconds between checkpoints of the display")
+    parser.add_argument("--resume", default=None, help="start the display from a checkpoint")
+    parser.add_argument("--record", default=None, help="directory of a memory-mapped per-step time series")
+    parser.add_argument("--record-every", type=int, default=1, help="record every N steps")
+    parser.add_argument("--fps", type=float, default=20, help="display frames per second; the engine runs independently")
+    parser.add_argument("--free-run", action="store_true", help="step the engine as fast as possible instead of one step per time_delay")
+    add_profile_arguments(parser)
+    commands = parser.add_subparsers(dest="command")
+
+    run = commands.add_parser("run", help="run the engine headless as fast as possible (no curses, no sleep)")
+    run.add_argument("--steps", type=int, required=True, help="number of simulation steps")
+    run.add_argument("--mode", choices=["Default", "Big Bang"], default="Default")
+    run.add_argument("--kinetics", choices=["Tau-Leap", "Bernoulli", "Next Reaction", "Spatial"], default=KINETICS)
+    run.add_argument("--seed", type=int, default=None, help="seed for a reproducible run")
+    run.add_argument("--timestep", type=float, default=timestep_multiplier * time_delay, help="simulated seconds per step")
+    run.add_argument("--snapshot-every", type=int, default=0, help="write a snapshot every N steps (0 = final only)")
+    run.add_argument("--output", default="snapshots.jsonl", help="JSON-lines snapshot file")
+    run.add_argument("--checkpoint", default=None, help="checkpoint file (.npz) written periodically and at the end")
+    run.add_argument("--checkpoint-every", type=int, default=10_000, help="checkpoint every N steps")
+    run.add_argument("--resume", default=None, help="continue from a checkpoint up to --steps total steps")
+    run.add_argument("--record", default=None, help="directory of a memory-mapped per-step time series")
+    run.add_argument("--record-every", type=int, default=1, help="record every N steps")
+    add_profile_arguments(run)
+
+    ensemble = commands.add_parser("ensemble", help="run many independent seeded realizations across CPU cores")
+    ensemble.add_argument("--runs", type=int, required=True, help="number of realizations")
+    ensemble.add_argument("--steps", type=int, required=True, help="simulation steps per realization")
+    ensemble.add_argument("--mode", choices=["Default", "Big Bang"], default="Default")
+    ensemble.add_argument("--kinetics", choices=["Tau-Leap", "Bernoulli", "Next Reaction", "Spatial"], default=KINETICS)
+    ensemble.add_argument("--seed", type=int, default=None, help="root seed; each realization gets its own stream")
+    ensemble.add_argument("--timestep", type=float, default=timestep_multiplier * time_delay, help="simulated seconds per step")
+    ensemble.add_argument("--record-every", type=int, default=100, help="record statistics every N steps")
+    ensemble.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    ensemble.add_argument("--output", default="ensemble.npz", help="statistics file (.npz)")
+
+    tables = commands.add_parser("build-tables", help="compile the species and channel dictionaries into the table cache")
+    tables.add_argument("--cache-dir", default=CACHE_DIR, help="directory of the compiled tables")
+
+    args = parser.parse_args(argv)
+    if args.command == "ensemble" and not 0 < args.record_every <= args.steps:
+        parser.error("--record-every must be between 1 and --steps")
+    return args
+
+def add_profile_arguments(parser):
+    parser.add_argument("--profile", default=None, help="time every step phase and write the totals to this .json or .csv file on exit")
+    parser.add_argument("--pstats", default=None, help="also write cProfile stats of a window of steps to this file")
+    parser.add_argument("--pstats-steps", type=parse_step_window, default=(0, 100), help="step window START:STOP of --pstats (default 0:100)")
+
+def cli(argv=None):
+    args = parse_args(argv)
+    engine = Engine()
+    if args.command != "ensemble" and (args.profile or args.pstats):
+        engine.profiler.pstats, engine.profiler.pstats_steps = args.pstats, args.pstats_steps
+        engine.profiler.enable()
+    if args.command == "run":
+        run_headless(args.steps, args.mode, args.kinetics, args.seed, args.timestep, args.snapshot_every, args.output,
+                     args.checkpoint, args.checkpoint_every, args.resume, args.record, args.record_every, engine=engine)
+    elif args.command == "build-tables":
+        load_tables(args.cache_dir, rebuild=True)
+        print(f"Tables compiled to {cache_path(dictionary_hash(), args.cache_dir)}")
+    elif args.command == "ensemble":
+        run_ensemble(args.runs, args.steps, args.mode, args.kinetics, args.seed, args.timestep, args.record_every, args.workers, args.output)
+    else:
+        state, saved = None, {}
+        if args.resume:
+            state, saved = load_checkpoint(args.resume, engine)
+        # Headless checkpoints record only the timestep; take it as a multiple of the default delay
+        delay = saved.get("time_delay", time_delay)
+        multiplier = saved.get("timestep_multiplier", saved["timestep"] / delay if "timestep" in saved else timestep_multiplier)
+        step = saved.get("step", 0)
+        recorder = TimeSeriesRecorder(args.record, args.record_every, resume_step=step if args.resume else None) if args.record else None
+        curses.wrapper(functools.partial(main, checkpoint=args.checkpoint, checkpoint_interval=args.checkpoint_interval,
+                                       recorder=recorder, fps=args.fps, free_run=args.free_run,
+                                       kinetics=saved.get("kinetics", KINETICS), engine=engine, state=state, step=step,
+                                       timestep_multiplier=multiplier, time_delay=delay))
+    if args.command != "ensemble":
+        engine.profiler.close()  # Writes a --pstats window the run ended inside of
+        if args.profile:
+            engine.profiler.dump(args.profile)
 
 if __name__ == "__main__":
-    curses.wrapper(main)
+    cli()
@@ -1,5 +1,3 @@
-from collections import defaultdict
-
 # Universal Constants
 c = 3e8  # Speed of light in vacuum (m/s)
 hbar = 6.582119569e-25  # Reduced Planck constant (GeV*s)
@@ -13,16 +11,13 @@ H0_in_s = H0 * 1e3 / (3.086e22)  # Hubble's constant converted to 1/s
 
 # Simulation Variables
 MODE = "Default"
-VOLUME = 100000.0
-particle_counts = defaultdict(int)
-total_particle_counts = defaultdict(int)
-total_energy = 0.0
-temperature = 1e12
-entropy = 0.0
-time_steps = 0
+KINETICS = "Tau-Leap"  # "Tau-Leap" (batched binomial), "Bernoulli" (one decay per species per step), "Next Reaction" (exact events) or "Spatial" (particles in the box)
+interaction_rate = 1.0  # Mass-action rate constant of interaction channels in "Tau-Leap", "Next Reaction" and "Spatial" kinetics (m^3/s)
+interaction_radius = 0.01  # Distance within which two particles can react in "Spatial" kinetics (m)
+particle_speed = 0.05  # Velocity spread per axis of new particles in "Spatial" kinetics (m/s)
+max_events_per_step = 50_000  # Event budget of one "Next Reaction" step
+fluctuations_per_step = 1  # Vacuum creation/annihilation events per step (sampled in one batch when > 1)
+VOLUME = 100000.0  # Starting volume of a new simulation (m^3)
+temperature = 1e12  # Starting temperature of a new simulation (K)
 time_delay = 0.1
 timestep_multiplier = 1
-total_particle_count = 0
-total_particles_created = 0
-total_particles_decayed_natural = 0
-total_particles_decayed_interaction = 0
@@ -1,150 +1,170 @@
+import curses
 import time
-import sys
+import numpy as np
 from modules.constants import *
-from modules.utils.calculations import *
-
-
-def reset_simulation():
-    global VOLUME, total_energy, temperature, entropy, time_steps, particle_counts, total_particles_created, total_particles_decayed_natural, total_particles_decayed_interaction
-    VOLUME = 1 if MODE == "Default" else 0.1
-    total_energy = 0.0
-    temperature = 2.7 if MODE == "Default" else 1e12
-    entropy = 0.0
-    time_steps = 0
-    particle_counts.clear()
-    total_particles_created = 0
-    total_particles_decayed_natural = 0
-    total_particles_decayed_interaction = 0
-
-def display_simulation(stdscr):
-    """Main display function for the simulation."""
-    global total_energy, entropy, temperature, time_steps, timestep_multiplier, time_delay
-    global total_particles_created, total_particles_decayed_interaction, total_particles_decayed_natural
-    global particle_counts, total_particle_count, VOLUME, MODE, total_particle_counts
+from modules.utils.species import SPECIES
+from modules.display.renderer import FrameRenderer, top_rows
+from modules.runner.worker import SimulationWorker
+
+KEY_COMMANDS = {
+    "m": ("mode",),
+    "k": ("kinetics",),
+    "r": ("reset",),
+    "f": ("free_run",),
+    "+": ("multiplier", 10),
+    "-": ("multiplier", 0.1),
+    "KEY_UP": ("volume", 1),
+    "KEY_DOWN": ("volume", -1),
+    "KEY_RIGHT": ("delay", -0.01),
+    "KEY_LEFT": ("delay", 0.01),
+}
+
+
+def display_simulation(stdscr, checkpoint=None, checkpoint_interval=60, recorder=None, fps=20, free_run=False,
+                       kinetics=KINETICS, engine=None, state=None, step=0, timestep_multiplier=timestep_multiplier, time_delay=time_delay):
+    """Main display function for the simulation.
+
+    The engine runs in a SimulationWorker thread; this loop only draws its latest
+    snapshot, at most fps times per second, and forwards key presses as commands.
+    With a checkpoint path the state is saved every checkpoint_interval seconds
+    and when quitting. A TimeSeriesRecorder, if given, receives every step. A state
+    (e.g. from a checkpoint) continues where it left off, from `step` and with the
+    saved timestep settings; otherwise a fresh one starts.
+    """
+    worker = SimulationWorker(kinetics, fps, free_run, checkpoint, checkpoint_interval, recorder, engine, state, step,
+                              timestep_multiplier, time_delay)
+    profiler = worker.engine.profiler
+    worker.start()
+    renderer = FrameRenderer(stdscr, fps)
 
     # Initialize timer and counters
     start_time = time.time()
     last_update_time = start_time
-    total_particles_created_last = total_particles_created
-    total_particles_decayed_natural_last = total_particles_decayed_natural
-    total_particles_decayed_interaction_last = total_particles_decayed_interaction
+    state = worker.snapshot
+    total_particles_created_last = state["total_particles_created"]
+    total_particles_decayed_natural_last = state["total_particles_decayed_natural"]
+    total_particles_decayed_interaction_last = state["total_particles_decayed_interaction"]
 
     particles_created_per_second = 0
     decayed_natural_per_second = 0
     decayed_interaction_per_second = 0
+    show_profile = False
 
-    while True:
-        # Get terminal dimensions
-        height, width = stdscr.getmaxyx()
+    while worker.is_alive():
+        if renderer.due():
+            render_start = time.perf_counter_ns()
+            draw = renderer.line
+            height, width = renderer.begin()
 
-        # Clear screen
-        stdscr.clear()
-
-        # Check if terminal is large enough
-        if height < 15 or width < 80:
-            stdscr.addstr(0, 0, "Terminal too small. Please resize to at least 80x15.")
-            stdscr.refresh()
-            time.sleep(1)
-            continue
-
-        # Calculate elapsed time and adjusted timestep
-        current_time = time.time()
-        elapsed_time = current_time - start_time
-        time_since_last_update = current_time - last_update_time
-        adjusted_timestep = timestep_multiplier * time_delay
-
-        # Update simulation
-        (entropy, temperature, total_energy, total_particles_created,
-         total_particles_decayed_interaction, total_particles_decayed_natural,
-         particle_counts, VOLUME, timestep_multiplier, time_steps, total_particle_count, total_particle_counts) = simulate_vacuum_energy(adjusted_timestep)
-
-        # Update total_particle_counts with new particles
-        for particle, count in particle_counts.items():
-            if particle not in total_particle_counts:
-                total_particle_counts[particle] = count
-            else:
-                total_particle_counts[particle] += count
-
-        # Update per-second rates if enough time has passed
-        if time_since_last_update >= 1:  # Update rates every second
-            particles_created_per_second = (total_particles_created - total_particles_created_last) / time_since_last_update
-            decayed_natural_per_second = (total_particles_decayed_natural - total_particles_decayed_natural_last) / time_since_last_update
-            decayed_interaction_per_second = (total_particles_decayed_interaction - total_particles_decayed_interaction_last) / time_since_last_update
-
-            # Update tracking variables
-            total_particles_created_last = total_particles_created
-            total_particles_decayed_natural_last = total_particles_decayed_natural
-            total_particles_decayed_interaction_last = total_particles_decayed_interaction
-            last_update_time = current_time
-
-        # Display simulation data
-        stdscr.addstr(0, 0, f"Mode: {MODE}")
-        stdscr.addstr(1, 0, f"Elapsed Earth Time: {elapsed_time:,.2f}s | Simulation Timesteps: {time_steps:,.2f}")
-        stdscr.addstr(2, 0, f"Timestep Multiplier: {timestep_multiplier}x | Effective Timestep: {adjusted_timestep:.2e}s")
-        stdscr.addstr(3, 0, f"Total Particles: {total_particles_created:,} | Rate: {particles_created_per_second:.2f} particles/s")
-        stdscr.addstr(4, 0, f"Decayed Naturally: {total_particles_decayed_natural:,} | Rate: {decayed_natural_per_second:.2f} decays/s")
-        stdscr.addstr(5, 0, f"Decayed via Interaction: {total_particles_decayed_interaction:,} | Rate: {decayed_interaction_per_second:.2f} decays/s")
-        avg_appearance_time = elapsed_time / total_particles_created if total_particles_created > 0 else 0
-        stdscr.addstr(6, 0, f"Average Appearance Time: {avg_appearance_time:.2f}s")
-        stdscr.addstr(7, 0, f"Volume: {VOLUME:,.2f} m³ | Temperature: {temperature:,.2f} K | Entropy: {entropy:,.2f}")
-        stdscr.addstr(8, 0, f"Radiation Density: {radiation_density():.2e} GeV/m³")
-        stdscr.addstr(9, 0, f"Gravitational Potential: {gravitational_potential():.2e} J")
-
-        # Display particle counts
-        row = 11
-        stdscr.addstr(row, 0, f"{'Particle':<30} | {'Current Count':<15} | {'Total Count':<15} | {'Percentage':<12} | {'New Avg':<10}")
-        row += 1
-        stdscr.addstr(row, 0, "-" * 85)
-        row += 1
-        total_particles_overall = sum(particle_counts.values())
-        # Sort the particles by their percentage high to low, protecting against division by zero
-        sorted_particles = sorted(particle_counts.items(), key=lambda x: (x[1] / total_particles_created * 100) if total_particles_created > 0 else 0, reverse=True)
-
-
-        for particle, count in sorted_particles:
-            if row < height - 2:
-                total_count = total_particle_counts.get(particle, 0)
-                percentage = (count / total_particles_created) * 100 if total_particles_created > 0 else 0
-                new_avg = total_count / total_particles_overall if total_particles_overall > 0 else 0
-                stdscr.addstr(row, 0, f"{particle:<30} | {count:<15,} | {total_count:<15,} | {percentage:.2f}%{"":<7} | {new_avg:.2f}")
-                row += 1
+            # Check if terminal is large enough
+            if height < 15 or width < 80:
+                draw(0, "Terminal too small. Please resize to at least 80x15.")
             else:
-                break
-
-        # Display controls
-        row += 2
-        if row < height:
-            stdscr.addstr(row, 0, "Controls: [M] Toggle Mode  [R] Reset  [+/-] Adjust Timestep  [UP/DOWN/LEFT/RIGHT] Adjust Volume  [Q] Quit")
-
-        # Refresh display
-        stdscr.refresh()
-
-        # Handle input
-        stdscr.nodelay(True)
+                state = worker.snapshot
+                current_time = time.time()
+                elapsed_time = current_time - start_time
+                time_since_last_update = current_time - last_update_time
+                total_particles_created = state["total_particles_created"]
+                total_particles_decayed_natural = state["total_particles_decayed_natural"]
+                total_particles_decayed_interaction = state["total_particles_decayed_interaction"]
+
+                # Update per-second rates if enough time has passed
+                if time_since_last_update >= 1:  # Update rates every second
+                    particles_created_per_second = (total_particles_created - total_particles_created_last) / time_since_last_update
+                    decayed_natural_per_second = (total_particles_decayed_natural - total_particles_decayed_natural_last) / time_since_last_update
+                    decayed_interaction_per_second = (total_particles_decayed_interaction - total_particles_decayed_interaction_last) / time_since_last_update
+
+                    # Update tracking variables
+                    total_particles_created_last = total_particles_created
+                    total_particles_decayed_natural_last = total_particles_decayed_natural
+                    total_particles_decayed_interaction_last = total_particles_decayed_interaction
+                    last_update_time = current_time
+
+                # Display simulation data
+                pacing = "Free-running" if state["free_run"] else f"Step every {state['time_delay']:.2f}s"
+                draw(0, f"Mode: {state['mode']} | Kinetics: {state['kinetics']} | {pacing} | {state['steps_per_second']:,.0f} steps/s")
+                draw(1, f"Elapsed Earth Time: {elapsed_time:,.2f}s | Simulation Timesteps: {state['time_steps']:,.2f} | Steps: {state['step']:,}")
+                draw(2, f"Timestep Multiplier: {state['timestep_multiplier']:g}x | Effective Timestep: {state['timestep']:.2e}s")
+                draw(3, f"Total Particles: {total_particles_created:,} | Rate: {particles_created_per_second:.2f} particles/s")
+                draw(4, f"Decayed Naturally: {total_particles_decayed_natural:,} | Rate: {decayed_natural_per_second:.2f} decays/s")
+                draw(5, f"Decayed via Interaction: {total_particles_decayed_interaction:,} | Rate: {decayed_interaction_per_second:.2f} decays/s")
+                avg_appearance_time = elapsed_time / total_particles_created if total_particles_created > 0 else 0
+                draw(6, f"Average Appearance Time: {avg_appearance_time:.2f}s")
+                draw(7, f"Volume: {state['volume']:,.2f} m³ | Temperature: {state['temperature']:,.2f} K | Entropy: {state['entropy']:,.2f}")
+                draw(8, f"Radiation Density: {state['radiation_density']:.2e} GeV/m³")
+                draw(9, f"Gravitational Potential: {state['gravitational_potential']:.2e} J")
+
+                row = 11
+                if show_profile:
+                    row = draw_profile(draw, row, state)
+                else:
+                    row = draw_particle_table(draw, row, height, state)
+
+                # Display controls
+                row += 2
+                draw(row, "Controls: [M] Toggle Mode  [K] Cycle Kinetics  [R] Reset  [F] Free-run  [P] Profile  [+/-] Adjust Timestep  "
+                          "[UP/DOWN] Adjust Volume  [LEFT/RIGHT] Adjust Step Delay  [Q] Quit")
+
+            # Write the changed rows only
+            renderer.present()
+            if profiler.enabled:
+                profiler.record("render", time.perf_counter_ns() - render_start)
+
+        # Handle input; waits for a key until the next frame is due, so input stays responsive
+        stdscr.timeout(max(1, int(renderer.remaining() * 1000)))
         try:
             key = stdscr.getkey()
-            if key.lower() == "m":
-                MODE = "Big Bang" if MODE == "Default" else "Default"
-                elapsed_time = 0
-                reset_simulation()
-            elif key.lower() == "r":
-                elapsed_time = 0
-                reset_simulation()
-            elif key == "+":
-                timestep_multiplier = min(timestep_multiplier * 10, 1e9)
-            elif key == "-":
-                timestep_multiplier = max(timestep_multiplier / 10, 1)
-            elif key == "KEY_UP":
-                VOLUME += 1
-            elif key == "KEY_DOWN" and VOLUME > 1:
-                VOLUME -= 1
-            elif key == "KEY_RIGHT":
-                time_delay = max(0.01, time_delay - 0.01)
-            elif key == "KEY_LEFT":
-                time_delay += 0.01
-            elif key.lower() == "q":
-                sys.exit()
-        except Exception:
-            pass
-
-        time.sleep(time_delay)
+        except curses.error:
+            continue
+        if key.lower() == "q":
+            break
+        if key.lower() == "p":
+            show_profile = not show_profile
+            worker.send("profile", show_profile)
+        command = KEY_COMMANDS.get(key) or KEY_COMMANDS.get(key.lower())
+        if command:
+            worker.send(*command)
+            if command[0] in ("mode", "reset"):
+                start_time = last_update_time = time.time()
+                total_particles_created_last = total_particles_decayed_natural_last = total_particles_decayed_interaction_last = 0
+
+    # Saves the final checkpoint and closes the recorder; re-raises an engine error
+    worker.stop()
+
+
+def draw_particle_table(draw, row, height, state):
+    """Draw the particle count table from `row` down; returns the row after it."""
+    particle_counts = state["particle_counts"]
+    total_particle_counts = state["total_particle_counts"]
+    total_particles_created = state["total_particles_created"]
+    draw(row, f"{'Particle':<30} | {'Current Count':<15} | {'Total Count':<15} | {'Percentage':<12} | {'New Avg':<10}")
+    row += 1
+    draw(row, "-" * 85)
+    row += 1
+    total_particles_overall = int(particle_counts.sum())
+    # Only the rows that fit are selected and formatted: species seen so far, by current count high to low
+    seen = np.flatnonzero(total_particle_counts)
+    for particle in top_rows(particle_counts, height - 2 - row, seen):
+        count = int(particle_counts[particle])
+        total_count = int(total_particle_counts[particle])
+        percentage = (count / total_particles_created) * 100 if total_particles_created > 0 else 0
+        new_avg = total_count / total_particles_overall if total_particles_overall > 0 else 0
+        draw(row, f"{SPECIES[particle]:<30} | {count:<15,} | {total_count:<15,} | {percentage:.2f}%{'':<7} | {new_avg:.2f}")
+        row += 1
+    return row
+
+
+def draw_profile(draw, row, state):
+    """Draw the per-phase timings of the profiler from `row` down; returns the row after it."""
+    draw(row, f"{'Phase':<16} | {'Rolling (µs)':>13} | {'Mean (µs)':>11} | {'Calls':>12} | {'Total (ms)':>12} | {'Share':>6}")
+    row += 1
+    draw(row, "-" * 85)
+    row += 1
+    if state["profile"] is None:
+        draw(row, "Profiling starts with the next snapshot...")
+        return row + 1
+    for phase in state["profile"]:
+        draw(row, f"{phase['phase']:<16} | {phase['rolling_us']:>13,.1f} | {phase['mean_us']:>11,.1f} | {phase['calls']:>12,} | "
+                  f"{phase['total_ms']:>12,.1f} | {phase['share']:>6.1%}")
+        row += 1
+    return row
@@ -0,0 +1,83 @@
+import curses
+import time
+import numpy as np
+
+# Self-contained on purpose: the root scripts import this as particle_sim.modules.display.renderer
+
+
+class FrameRenderer:
+    """Differential line renderer for a curses window with an FPS cap.
+
+    A frame is built with line() calls between begin() and present(). present()
+    only rewrites rows whose text changed since the previous frame and flushes
+    with noutrefresh()/doupdate(). The whole window is erased only after a resize,
+    never with clear(), so unchanged cells are not re-sent to the terminal.
+    """
+
+    def __init__(self, stdscr, fps=20):
+        self.stdscr = stdscr
+        self.frame_interval = 1 / fps if fps else 0
+        self.last_present = float("-inf")
+        self.size = None
+        self.previous = []
+        self.lines = []
+
+    def due(self):
+        """Whether the FPS cap allows the next frame to be drawn now."""
+        return time.perf_counter() - self.last_present >= self.frame_interval
+
+    def remaining(self):
+        """Seconds until the next frame is due (zero if it already is)."""
+        return max(0.0, self.last_present + self.frame_interval - time.perf_counter())
+
+    def begin(self):
+        """Start a new frame; returns the window's (height, width)."""
+        size = self.stdscr.getmaxyx()
+        if size != self.size:
+            # After a resize the terminal content is unknown, so repaint everything
+            self.stdscr.erase()
+            self.size = size
+            self.previous = []
+        self.lines = []
+        return size
+
+    def line(self, row, text):
+        """Place `text` on `row` of the frame; rows outside the window are dropped."""
+        if row >= self.size[0]:
+            return
+        if row >= len(self.lines):
+            self.lines.extend([""] * (row + 1 - len(self.lines)))
+        self.lines[row] = text[:self.size[1] - 1]
+
+    def present(self):
+        """Write the rows that differ from the previous frame and update the terminal."""
+        stdscr = self.stdscr
+        previous = self.previous
+        for row in range(max(len(self.lines), len(previous))):
+            text = self.lines[row] if row < len(self.lines) else ""
+            if row < len(previous) and previous[row] == text:
+                continue
+            stdscr.move(row, 0)
+            if text:
+                stdscr.addstr(text)
+            stdscr.clrtoeol()
+        stdscr.noutrefresh()
+        curses.doupdate()
+        self.previous = self.lines
+        self.last_present = time.perf_counter()
+
+
+def top_rows(values, k, candidates=None):
+    """Indices of the k largest values (among candidates), largest first.
+
+    Uses argpartition so only the k visible rows are sorted; ties keep index order.
+    """
+    if candidates is None:
+        candidates = np.arange(len(values))
+    if k <= 0 or len(candidates) == 0:
+        return candidates[:0]
+    keys = -np.asarray(values)[candidates]
+    if len(candidates) > k:
+        keep = np.sort(np.argpartition(keys, k - 1)[:k])
+        candidates, keys = candidates[keep], keys[keep]
+    return candidates[np.argsort(keys, kind="stable")]
@@ -0,0 +1,74 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from modules.constants import KINETICS, time_delay, timestep_multiplier
+from modules.utils.calculations import Engine
+from modules.utils.species import SPECIES
+from modules.utils.streaming_stats import RunningMoments, P2Quantile
+
+# Columns of one trajectory row: the state variables followed by one count per species
+STATE_COLUMNS = ("time_steps", "volume", "temperature", "entropy")
+COLUMNS = STATE_COLUMNS + SPECIES
+QUANTILES = (0.05, 0.5, 0.95)
+
+
+def run_realization(task):
+    """Run one seeded trajectory and return its recorded rows.
+
+    Runs in a worker process; every realization gets a fresh state drawing from
+    its own SeedSequence child, so results do not depend on how runs are scheduled.
+    """
+    seed_sequence, steps, mode, kinetics, timestep, record_every = task
+    engine = Engine()
+    state = engine.new_state(mode, seed=seed_sequence)
+
+    trajectory = np.empty((steps // record_every, len(COLUMNS)), dtype=np.float64)
+    for step in range(1, steps + 1):
+        engine.step(state, timestep, kinetics)
+        if step % record_every == 0:
+            row = trajectory[step // record_every - 1]
+            row[:4] = state.time_steps, state.volume, state.temperature, state.entropy
+            row[4:] = state.particle_counts
+    return trajectory
+
+
+def run_ensemble(runs, steps, mode="Default", kinetics=KINETICS, seed=None, timestep=timestep_multiplier * time_delay,
+                 record_every=100, workers=None, output="ensemble.npz", log=print):
+    """Run independent realizations across a process pool and aggregate them as they finish.
+
+    Only the running statistics are held in memory: per recorded step and column
+    the mean, variance and QUANTILES (streaming P-squared estimates). They are saved
+    to `output` as an .npz file. Returns the number of realizations per second.
+    """
+    workers = workers or os.cpu_count()
+    n_records = steps // record_every
+    shape = (n_records, len(COLUMNS))
+    moments = RunningMoments(shape)
+    quantiles = [P2Quantile(p, shape) for p in QUANTILES]
+
+    children = np.random.SeedSequence(seed).spawn(runs)
+    tasks = [(child, steps, mode, kinetics, timestep, record_every) for child in children]
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for done, trajectory in enumerate(pool.map(run_realization, tasks, chunksize=max(1, runs // (4 * workers))), 1):
+            moments.add(trajectory)
+            for estimate in quantiles:
+                estimate.add(trajectory)
+            if done % max(1, runs // 10) == 0:
+                log(f"{done}/{runs} realizations | {done / (time.perf_counter() - start):.2f} runs/s")
+    elapsed = time.perf_counter() - start
+
+    np.savez_compressed(
+        output,
+        columns=np.array(COLUMNS),
+        steps=np.arange(1, n_records + 1) * record_every,
+        mean=moments.mean,
+        variance=moments.variance,
+        quantile_levels=np.array(QUANTILES),
+        quantiles=np.stack([estimate.value for estimate in quantiles]),
+        runs=runs,
+    )
+    log(f"{runs} realizations x {steps:,} steps in {elapsed:.2f}s on {workers} workers, statistics in {output}")
+    return runs / elapsed
@@ -0,0 +1,87 @@
+import json
+import time
+from modules.constants import KINETICS, time_delay, timestep_multiplier
+from modules.utils.calculations import Engine
+from modules.utils.checkpoint import save_checkpoint, load_checkpoint
+from modules.utils.recorder import TimeSeriesRecorder
+from modules.utils.species import species_view
+
+
+def engine_snapshot(state, step):
+    """Collect a state's variables and name-keyed counts into a dict."""
+    return {
+        "step": step,
+        "mode": state.mode,
+        "time_steps": state.time_steps,
+        "volume": state.volume,
+        "temperature": state.temperature,
+        "entropy": state.entropy,
+        "total_energy": state.total_energy,
+        "total_particles_created": state.total_particles_created,
+        "total_particles_decayed_natural": state.total_particles_decayed_natural,
+        "total_particles_decayed_interaction": state.total_particles_decayed_interaction,
+        "particle_counts": species_view(state.particle_counts),
+    }
+
+
+def run_headless(steps, mode="Default", kinetics=KINETICS, seed=None, timestep=timestep_multiplier * time_delay,
+                 snapshot_every=0, output="snapshots.jsonl", checkpoint=None, checkpoint_every=0, resume=None,
+                 record=None, record_every=1, log=print, engine=None):
+    """Run the engine without curses or sleeping and write JSON-lines snapshots.
+
+    A snapshot is written every `snapshot_every` steps (0 disables periodic
+    snapshots) and once more at the end. With `checkpoint` the full state is saved
+    every `checkpoint_every` steps and at the end; `resume` continues such a
+    checkpoint up to `steps` total steps, reusing its kinetics and timestep.
+    With `record` every `record_every`-th step is appended to a memory-mapped
+    time series in that directory. `engine` defaults to a new Engine(). Returns
+    the measured steps per second.
+    """
+    engine = engine or Engine()
+    first_step = 1
+    if resume:
+        state, saved = load_checkpoint(resume, engine)
+        if "step" not in saved:
+            raise ValueError(f"{resume} does not record its step (saved by an older display); it can only be resumed with the display")
+        first_step = saved["step"] + 1
+        kinetics, timestep = saved["kinetics"], saved["timestep"]
+        log(f"Resuming {resume} at step {saved['step']:,}")
+    else:
+        state = engine.new_state(mode, seed=seed)
+
+    recorder = TimeSeriesRecorder(record, record_every, resume_step=first_step - 1 if resume else None) if record else None
+
+    with open(output, "a" if resume else "w") as snapshots:
+        start = time.perf_counter()
+        last_report = start
+        for step in range(first_step, steps + 1):
+            engine.step(state, timestep, kinetics)
+            if recorder:
+                with engine.profiler.phase("record"):
+                    recorder.record(step, state.time_steps, state.volume, state.temperature, state.entropy, state.particle_counts)
+
+            if snapshot_every and step % snapshot_every == 0:
+                with engine.profiler.phase("snapshot"):
+                    snapshots.write(json.dumps(engine_snapshot(state, step)) + "\n")
+                now = time.perf_counter()
+                if now - last_report >= 1:
+                    log(f"step {step:,}/{steps:,} | {(step - first_step + 1) / (now - start):,.0f} steps/s")
+                    last_report = now
+            if checkpoint and checkpoint_every and step % checkpoint_every == 0:
+                with engine.profiler.phase("checkpoint"):
+                    if recorder:
+                        recorder.flush()
+                    save_checkpoint(checkpoint, state, step=step, kinetics=kinetics, timestep=timestep)
+
+        elapsed = time.perf_counter() - start
+        final = engine_snapshot(state, steps)
+        final["final"] = True
+        final["steps_per_second"] = (steps - first_step + 1) / elapsed if elapsed > 0 else float("inf")
+        snapshots.write(json.dumps(final) + "\n")
+    if recorder:
+        recorder.close()
+    if checkpoint:
+        save_checkpoint(checkpoint, state, step=steps, kinetics=kinetics, timestep=timestep)
+
+    log(f"{steps - first_step + 1:,} steps in {elapsed:.2f}s ({final['steps_per_second']:,.0f} steps/s), snapshots in {output}")
+    return final["steps_per_second"]
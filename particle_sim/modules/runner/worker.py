@@ -0,0 +1,208 @@
+import queue
+import threading
+import time
+from modules.constants import KINETICS, time_delay, timestep_multiplier
+from modules.utils.calculations import Engine
+from modules.utils.checkpoint import save_checkpoint
+
+KINETICS_CYCLE = {"Tau-Leap": "Bernoulli", "Bernoulli": "Next Reaction", "Next Reaction": "Spatial", "Spatial": "Tau-Leap"}
+MAX_CATCH_UP = 1.0  # Seconds of missed paced steps made up before the schedule is restarted
+
+
+def reset_for_mode(engine, state, mode):
+    """Reset a state with the starting volume and temperature of a display mode."""
+    volume = 1 if mode == "Default" else 0.1
+    temperature = 2.7 if mode == "Default" else 1e12
+    engine.reset(state, mode, volume, temperature)
+
+
+class SimulationWorker(threading.Thread):
+    """Advance a simulation in a background thread and publish snapshots of its state.
+
+    Each step covers timestep_multiplier * time_delay simulated seconds. Paced, one
+    step is due every time_delay wall seconds (the old display cadence); free-running,
+    steps run back to back. Every 1/fps seconds a snapshot dict with copies of the
+    counts is built and swapped into `snapshot`, so readers never see a half-updated
+    state and never take a lock. The state is only touched by this thread; the
+    display sends commands (see handle_command) through `commands`. Without a
+    `state` (e.g. one loaded from a checkpoint) a fresh one is started; a resumed
+    state passes the saved step and timestep settings along with it.
+    """
+
+    def __init__(self, kinetics=KINETICS, fps=20, free_run=False, checkpoint=None, checkpoint_interval=60, recorder=None,
+                 engine=None, state=None, step=0, timestep_multiplier=timestep_multiplier, time_delay=time_delay):
+        super().__init__(name="simulation", daemon=True)
+        self.engine = engine or Engine()
+        self.state = state or self.engine.new_state()
+        self.kinetics = kinetics
+        self.frame_interval = 1 / fps
+        self.free_run = free_run
+        self.timestep_multiplier = timestep_multiplier
+        self.time_delay = time_delay
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        self.recorder = recorder
+        self.profile_requested = self.engine.profiler.enabled  # Profiling asked for on the command line stays on
+        self.commands = queue.Queue()
+        self.step = step
+        self.steps_per_second = 0.0
+        self.error = None
+        self.running = True
+        self.snapshot = None
+        self.publish()
+
+    @property
+    def timestep(self):
+        return self.timestep_multiplier * self.time_delay
+
+    def publish(self):
+        """Swap in a fresh snapshot of the state (a single reference assignment)."""
+        engine, state = self.engine, self.state
+        with engine.profiler.phase("potential"):
+            potential = engine.gravitational_potential(state)
+        self.snapshot = {
+            "step": self.step,
+            "mode": state.mode,
+            "kinetics": self.kinetics,
+            "free_run": self.free_run,
+            "timestep_multiplier": self.timestep_multiplier,
+            "time_delay": self.time_delay,
+            "timestep": self.timestep,
+            "steps_per_second": self.steps_per_second,
+            "time_steps": state.time_steps,
+            "volume": state.volume,
+            "temperature": state.temperature,
+            "entropy": state.entropy,
+            "total_energy": state.total_energy,
+            "total_particles_created": state.total_particles_created,
+            "total_particles_decayed_natural": state.total_particles_decayed_natural,
+            "total_particles_decayed_interaction": state.total_particles_decayed_interaction,
+            "radiation_density": engine.radiation_density(state),
+            "gravitational_potential": potential,
+            "particle_counts": state.particle_counts.copy(),
+            "total_particle_counts": state.total_particle_counts.copy(),
+            "profile": engine.profiler.summary() if engine.profiler.enabled else None,
+        }
+
+    def send(self, command, *args):
+        self.commands.put((command, args))
+
+    def handle_command(self, command, args):
+        """Apply one display command between steps."""
+        engine, state = self.engine, self.state
+        if command == "mode":
+            reset_for_mode(engine, state, "Big Bang" if state.mode == "Default" else "Default")
+        elif command == "reset":
+            reset_for_mode(engine, state, state.mode)
+        elif command == "kinetics":
+            self.kinetics = KINETICS_CYCLE[self.kinetics]
+        elif command == "multiplier":
+            self.timestep_multiplier = min(max(self.timestep_multiplier * args[0], 1), 1e9)
+        elif command == "delay":
+            self.time_delay = max(0.01, self.time_delay + args[0])
+        elif command == "volume":
+            if state.volume + args[0] >= 1:
+                state.volume += args[0]
+        elif command == "free_run":
+            self.free_run = not self.free_run
+        elif command == "profile":
+            if args[0]:
+                engine.profiler.enable()
+            elif not self.profile_requested:
+                engine.profiler.disable()
+        elif command == "stop":
+            self.running = False
+
+    def wait_for_command(self, timeout):
+        """Handle queued commands, blocking up to `timeout` seconds for the first one.
+
+        Returns True if any command was handled, which restarts the step schedule.
+        """
+        handled = False
+        try:
+            command = self.commands.get(timeout=timeout) if timeout > 0 else self.commands.get_nowait()
+            while True:
+                self.handle_command(*command)
+                handled = True
+                command = self.commands.get_nowait()
+        except queue.Empty:
+            pass
+        return handled
+
+    def advance(self):
+        """Run one step, record it and add it to the running count totals."""
+        engine, state = self.engine, self.state
+        engine.step(state, self.timestep, self.kinetics)
+        self.step += 1
+        state.total_particle_counts += state.particle_counts
+        if self.recorder:
+            with engine.profiler.phase("record"):
+                self.recorder.record(self.step, state.time_steps, state.volume, state.temperature, state.entropy, state.particle_counts)
+
+    def save(self):
+        if self.recorder:
+            self.recorder.flush()
+        save_checkpoint(self.checkpoint, self.state, step=self.step, kinetics=self.kinetics, timestep=self.timestep,
+                        timestep_multiplier=self.timestep_multiplier, time_delay=self.time_delay)
+
+    def run(self):
+        try:
+            self.loop()
+        except Exception as error:
+            self.error = error
+        finally:
+            self.running = False
+            if self.error is None and self.checkpoint:
+                self.save()
+            if self.recorder:
+                self.recorder.close()
+            self.publish()
+
+    def loop(self):
+        now = time.perf_counter()
+        pace_start, paced_steps = now, 0
+        next_publish = now + self.frame_interval
+        next_checkpoint = now + self.checkpoint_interval
+        rate_start, rate_step = now, self.step
+
+        while self.running:
+            now = time.perf_counter()
+            if self.free_run:
+                # Step until the next frame is due, then look at the commands once
+                while now < next_publish:
+                    self.advance()
+                    now = time.perf_counter()
+                restart = self.wait_for_command(0)
+            else:
+                due = int((now - pace_start) / self.time_delay) - paced_steps
+                if due > MAX_CATCH_UP / self.time_delay:
+                    # Too far behind (slow steps or a long pause): drop the backlog
+                    pace_start, paced_steps, due = now, 0, 1
+                while due > 0 and now < next_publish:
+                    self.advance()
+                    paced_steps += 1
+                    due -= 1
+                    now = time.perf_counter()
+                next_step = pace_start + (paced_steps + 1) * self.time_delay
+                restart = self.wait_for_command(min(next_step, next_publish) - now)
+
+            if restart:
+                pace_start, paced_steps = time.perf_counter(), 0
+
+            now = time.perf_counter()
+            if now >= next_publish:
+                if now - rate_start >= 1:
+                    self.steps_per_second = (self.step - rate_step) / (now - rate_start)
+                    rate_start, rate_step = now, self.step
+                self.publish()
+                next_publish = now + self.frame_interval
+            if self.checkpoint and now >= next_checkpoint:
+                self.save()
+                next_checkpoint = now + self.checkpoint_interval
+
+    def stop(self):
+        """Ask the worker to finish its current step, save and exit; waits for it."""
+        self.send("stop")
+        self.join()
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,86 @@
+import numpy as np
+
+
+class ActiveIndex:
+    """Lazily maintained view of the part of the reaction network that can act.
+
+    Tracks which species are populated, which populated species can decay, and for
+    every interaction channel how many of its reactants are short of their
+    multiplicity (a channel is enabled when none are). Count changes only mark
+    species as changed; the next query refreshes the reactant entries of those
+    species alone, so a step costs in proportion to what moved. Channels touched
+    by a refresh are marked dirty, and cached propensity factors are recomputed
+    only for dirty channels that are enabled.
+
+    On a small network (a dense reactant matrix, e.g. the shipped one) that
+    bookkeeping costs more per count change than scanning every species and
+    channel, so there mark() does nothing and each query is answered from the
+    whole count vector, with the same results.
+    """
+
+    def __init__(self, reactants, decays, counts):
+        self.reactants = reactants
+        self.decays = decays
+        self.mass_action = np.zeros(reactants.shape[0], dtype=np.float64)
+        self.dense = reactants.dense
+        self.reset(counts)
+
+    def reset(self, counts):
+        """Rebuild everything from a count vector (after a reset or a checkpoint load)."""
+        reactants = self.reactants
+        self.counts = counts
+        self.changed = np.zeros(reactants.shape[1], dtype=bool)
+        self.populated = counts > 0
+        self.decaying = self.populated & self.decays
+        self.short = counts[reactants.indices] < reactants.data  # Per reactant entry
+        self.missing = np.bincount(reactants.row_ids, weights=self.short, minlength=reactants.shape[0]).astype(np.int64)
+        self.dirty = np.ones(reactants.shape[0], dtype=bool)
+
+    def mark(self, species):
+        """Note that the count of `species` (an ID or an array of IDs) changed."""
+        if not self.dense:
+            self.changed[species] = True
+
+    def refresh(self):
+        """Bring the index up to date with the species marked since the last query."""
+        changed = self.changed
+        species = np.flatnonzero(changed)
+        if species.size == 0:
+            return
+        reactants, counts = self.reactants, self.counts
+        populated = counts[species] > 0
+        self.populated[species] = populated
+        self.decaying[species] = populated & self.decays[species]
+
+        entries = np.flatnonzero(changed[reactants.indices])
+        if entries.size:
+            short = counts[reactants.indices[entries]] < reactants.data[entries]
+            channels = reactants.row_ids[entries]
+            self.missing += np.bincount(channels, weights=short.astype(np.int64) - self.short[entries], minlength=reactants.shape[0]).astype(np.int64)
+            self.short[entries] = short
+            self.dirty[channels] = True
+        changed[species] = False
+
+    def decaying_species(self):
+        """IDs of populated species that can decay."""
+        if self.dense:
+            return np.flatnonzero((self.counts > 0) & self.decays)
+        self.refresh()
+        return np.flatnonzero(self.decaying)
+
+    def enabled_channels(self):
+        """IDs of channels whose reactants are all present in the required numbers."""
+        if self.dense:
+            return np.flatnonzero(self.reactants.rows_satisfied(self.counts))
+        self.refresh()
+        return np.flatnonzero(self.missing == 0)
+
+    def mass_action_of(self, channels):
+        """Combinatorial propensity factors of enabled `channels`, recomputing only dirty ones."""
+        if self.dense:
+            return self.reactants.mass_action(self.counts, channels)
+        stale = channels[self.dirty[channels]]
+        if stale.size:
+            self.mass_action[stale] = self.reactants.mass_action(self.counts, stale)
+            self.dirty[stale] = False
+        return self.mass_action[channels]
@@ -0,0 +1,63 @@
+import numpy as np
+
+
+class AliasTable:
+    """Walker/Vose alias table for O(1) sampling of a fixed discrete distribution.
+
+    Built once in O(n) from non-negative weights (they need not sum to one). Each
+    sample costs one uniform draw: pick a column i, keep it with probability
+    prob[i] and otherwise take its alias. There is no rejection loop, so weights
+    spanning many orders of magnitude cost the same as uniform ones.
+    """
+
+    def __init__(self, weights):
+        weights = np.asarray(weights, dtype=np.float64)
+        if weights.ndim != 1 or weights.size == 0 or (weights < 0).any() or not weights.sum() > 0:
+            raise ValueError("AliasTable needs a non-empty 1-d array of non-negative weights with a positive sum")
+        n = weights.size
+        scaled = (weights * (n / weights.sum())).tolist()
+        prob = [1.0] * n
+        alias = list(range(n))
+
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            prob[s] = scaled[s]
+            alias[s] = l
+            # The large column donates the mass that fills column s up to one
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        # Whatever remains is 1 up to rounding error
+
+        self.set_arrays(np.array(prob), np.array(alias, dtype=np.int64))
+
+    @classmethod
+    def from_arrays(cls, prob, alias):
+        """Wrap the prob/alias arrays of a table built earlier (e.g. from the table cache)."""
+        table = cls.__new__(cls)
+        table.set_arrays(np.asarray(prob, dtype=np.float64), np.asarray(alias, dtype=np.int64))
+        return table
+
+    def set_arrays(self, prob, alias):
+        self.n = prob.size
+        self.prob = prob
+        self.alias = alias
+        self._prob = prob.tolist()  # Python lists for the scalar sample path
+        self._alias = alias.tolist()
+
+    def sample(self, rng, size=None):
+        """Draw one index (size=None) or an int64 array of `size` indices using a BufferedRNG."""
+        if size is None:
+            u = rng.random() * self.n
+            i = min(int(u), self.n - 1)  # random() * n can round up to n
+            return i if u - i < self._prob[i] else self._alias[i]
+        u = rng.random(size) * self.n
+        i = np.minimum(u.astype(np.int64), self.n - 1)
+        return np.where(u - i < self.prob[i], i, self.alias[i])
+
+    def probabilities(self):
+        """The normalized distribution the table samples from (for checking a build)."""
+        p = self.prob / self.n
+        np.add.at(p, self.alias, (1.0 - self.prob) / self.n)
+        return p
@@ -1,10 +1,23 @@
-import random
 import numpy as np
-import time
 from modules.constants import *
-from modules.dictionaries.particles import PARTICLES
-from modules.dictionaries.decay_channels import DECAY_CHANNELS
-from modules.dictionaries.interaction_channels import INTERACTION_CHANNELS
+from modules.utils.species import TABLES, SPECIES_ID, N_SPECIES, MASS, LIFETIME, UNSTABLE
+from modules.utils.channels import DECAYS, DECAY_BRANCH_PROBS, DECAY_BRANCH_PRODUCTS
+from modules.utils.channels import INTERACTION_REACTANTS, INTERACTION_PRODUCTS, INTERACTION_BRANCH_ROWS, INTERACTION_BRANCH_PROBS
+from modules.utils.next_reaction import NextReactionEngine, compile_reaction_network
+from modules.utils.rng import BufferedRNG
+from modules.utils.alias import AliasTable
+from modules.utils.active_index import ActiveIndex
+from modules.utils.profiling import PhaseProfiler
+from modules.utils.state import SimulationState
+from modules.utils.spatial import SpatialModel
+from modules.utils.potential import pair_potential_moments, sampled_pair_potential
+
+# Decay products keyed by species ID: one tuple of product IDs per branch, from the compiled branch tables
+DECAY_PRODUCTS = {int(s): [tuple(np.repeat(np.arange(N_SPECIES), DECAY_BRANCH_PRODUCTS[s, k]).tolist())
+                           for k in np.flatnonzero(DECAY_BRANCH_PROBS[s])]
+                  for s in np.flatnonzero(DECAYS)}
+PHOTON = SPECIES_ID["Photon"]
+VACUUM_TABLE = AliasTable.from_arrays(TABLES["vacuum_alias_prob"], TABLES["vacuum_alias"])  # Species of a vacuum fluctuation, drawn in proportion to vacuum_prob
 
 
 def hubble_expansion(volume, adjusted_timestep):
@@ -17,142 +30,312 @@ def zero_point_energy(mass):
     return 0.5 * hbar * omega
 
 
+ZERO_POINT_ENERGY = zero_point_energy(MASS)  # Per-species zero-point energy, indexed by species ID
+
+
 def relativistic_energy(mass, speed):
     """Calculate relativistic energy."""
     gamma = 1 / np.sqrt(1 - (speed ** 2) / (c ** 2))
     return gamma * mass * c**2
 
 
-def decay_particle(particle):
-    """Handle particle decay."""
-    global total_particles_decayed_natural
-    if particle in DECAY_CHANNELS and particle_counts.get(particle, 0) > 0:
-        particle_counts[particle] -= 1
-        total_particles_decayed_natural += 1
-
-        for product in random.choice(DECAY_CHANNELS[particle]):
-            if product not in particle_counts:
-                particle_counts[product] = 0
-            particle_counts[product] += 1
-
-    return total_particles_decayed_natural
-
-
-def handle_interactions():
-    """Handle particle interactions."""
-    global total_particles_decayed_interaction
-    particle_combinations = list(INTERACTION_CHANNELS.keys())
-
-    for combination in particle_combinations:
-        # Check if all particles in the combination exist
-        if all(particle_counts.get(particle, 0) > 0 for particle in combination):
-            if random.random() < 0.01:  # Interaction probability
-                # Reduce counts for all particles involved in the interaction
-                for particle in combination:
-                    if particle_counts[particle] > 0:  # Ensure no negative values
-                        particle_counts[particle] -= 1
-
-                # Select a random product set for this interaction
-                products = random.choice(INTERACTION_CHANNELS[combination])
-
-                # Increment counts for all products
-                for product in products:
-                    if product not in particle_counts:
-                        particle_counts[product] = 0
-                    particle_counts[product] += 1
-
-                # Update total interaction count
-                total_particles_decayed_interaction += 1
-
-    return total_particles_decayed_interaction
-
-
-def radiation_density():
-    """Calculate radiation density."""
-    global total_energy
-    photon_count = particle_counts.get("Photon", 0)
-    energy_per_photon = hbar * c / 1e-7  # Assume average photon wavelength of 1e-7 m
-    return photon_count * energy_per_photon / VOLUME
-
-
-def gravitational_potential():
-    """Calculate gravitational potential energy."""
-    total_potential = 0
-    for p1, c1 in particle_counts.items():
-        for p2, c2 in particle_counts.items():
-            if p1 != p2:
-                r = random.uniform(1e-10, 1e-3)  # Random distance between particles
-                total_potential += -G * PARTICLES[p1]["mass"] * PARTICLES[p2]["mass"] * c1 * c2 / r
-    return total_potential
-
-
-
-def decide_particle_action():
-    """Decides whether to create or annihilate a particle based on its appearance probability and lifetime."""
-    # Choose a particle type
-    particle_type = random.choice(list(PARTICLES.keys()))
-    
-    # Get the particle's properties
-    particle = PARTICLES[particle_type]
-    creation_probability = particle["vacuum_prob"]
-    lifetime = particle["lifetime"]
-    
-
-    if random.random() < creation_probability:
-        action = "create"
-    else:
-        decay_probability = min(1, time.time() / lifetime)  # The decay probability increases over time
-        if random.random() < decay_probability:
-            action = "annihilate"
+class Engine:
+    """The vacuum energy model: immutable species and channel tables plus the step logic.
+
+    An Engine holds no simulation state. Every method takes the SimulationState it
+    works on and mutates only that, so one engine can advance any number of states
+    (in threads, batches or a server) without globals. The tables default to the
+    ones compiled from the dictionaries; `interactions` (reactant and product
+    StoichiometryMatrix, branch_rows, branch_probs as in channels.py),
+    `decays` (per-species mask of species that can decay) and `zero_point_energy`
+    can be replaced together for a different network.
+    """
+
+    def __init__(self, interactions=None, decays=None, zero_point_energy=ZERO_POINT_ENERGY,
+                 interaction_rate=interaction_rate, max_events=max_events_per_step,
+                 interaction_radius=interaction_radius, particle_speed=particle_speed):
+        if interactions is None:
+            interactions = INTERACTION_REACTANTS, INTERACTION_PRODUCTS, INTERACTION_BRANCH_ROWS, INTERACTION_BRANCH_PROBS
+        self.reactants, self.products, self.branch_rows, self.branch_probs = interactions
+        self.order = self.reactants.row_sums(np.ones(self.reactants.shape[1]))  # Number of reactant particles per channel
+        self.decays = DECAYS & UNSTABLE if decays is None else decays
+        self.zero_point_energy = zero_point_energy
+        self.interaction_rate = interaction_rate
+        self.max_events = max_events
+        self.reactions = None  # Next-reaction network, compiled on first use
+        self.interaction_radius = interaction_radius
+        self.particle_speed = particle_speed
+        self.spatial = None  # SpatialModel, built on first use
+        self.profiler = PhaseProfiler()  # Per-phase step timings; disabled (and free) until enabled
+
+    def new_state(self, mode=MODE, volume=VOLUME, initial_temperature=temperature, seed=None):
+        """Return a fresh, empty SimulationState for this engine's network drawing from `seed`."""
+        counts = np.zeros(self.reactants.shape[1], dtype=np.int64)
+        return SimulationState(counts, ActiveIndex(self.reactants, self.decays, counts), BufferedRNG(seed),
+                               mode, volume, initial_temperature)
+
+    def reset(self, state, mode=MODE, volume=VOLUME, initial_temperature=temperature):
+        """Reset a state's variables and particles for a fresh run in the given mode."""
+        state.reset(mode, volume, initial_temperature)
+        self.clear_particles(state)
+
+    def change_count(self, state, particle, change):
+        """Change one species' count and update the running totals by the delta."""
+        counts = state.particle_counts
+        before = int(counts[particle])
+        counts[particle] = before + change
+        state.current_energy += float(self.zero_point_energy[particle]) * change
+        state.total_particle_count += change
+        state.populated_species += (before + change > 0) - (before > 0)
+        state.counts_version += 1
+        state.active.mark(particle)
+
+    def apply_delta(self, state, delta):
+        """Add a per-species delta vector to the counts, touching only the changed species."""
+        changed = np.flatnonzero(delta)
+        if changed.size == 0:
+            return
+        counts = state.particle_counts
+        change = delta[changed]
+        before = counts[changed]
+        after = before + change
+        counts[changed] = after
+        state.current_energy += float(self.zero_point_energy[changed] @ change)
+        state.total_particle_count += int(change.sum())
+        state.populated_species += int(np.count_nonzero(after) - np.count_nonzero(before))
+        state.counts_version += 1
+        state.active.mark(changed)
+
+    def clear_particles(self, state):
+        """Remove every particle and zero the running totals derived from the counts."""
+        state.particle_counts.fill(0)
+        state.current_energy = 0.0
+        state.total_particle_count = 0
+        state.populated_species = 0
+        state.counts_version += 1
+        state.active.reset(state.particle_counts)
+
+    def decay_particle(self, state, particle):
+        """Handle particle decay."""
+        if particle in DECAY_PRODUCTS and state.particle_counts[particle] > 0:
+            self.change_count(state, particle, -1)
+            state.total_particles_decayed_natural += 1
+
+            for product in state.rng.choice(DECAY_PRODUCTS[particle]):
+                self.change_count(state, product, 1)
+
+    def tau_leap_decays(self, state, adjusted_timestep):
+        """Decay all species in one batched step (tau-leaping).
+
+        Each of the N particles of a species survives the step with probability
+        exp(-dt/lifetime), so the number of decays is Binomial(N, 1 - exp(-dt/lifetime)).
+        The decays of each species are then split across its DECAY_CHANNELS branches
+        with a multinomial draw, so the cost does not depend on N or dt.
+        """
+        candidates = state.active.decaying_species()
+        if candidates.size == 0:
+            return
+        rng = state.rng
+        n_candidate_decays = rng.binomial(state.particle_counts[candidates], -np.expm1(-adjusted_timestep / LIFETIME[candidates]))
+
+        hit = np.flatnonzero(n_candidate_decays)
+        if hit.size:
+            decayed, n_decays = candidates[hit], n_candidate_decays[hit]
+            branch_counts = rng.multinomial(n_decays, DECAY_BRANCH_PROBS[decayed])
+            delta = np.einsum("dk,dks->s", branch_counts, DECAY_BRANCH_PRODUCTS[decayed])
+            delta[decayed] -= n_decays
+            self.apply_delta(state, delta)
+            state.total_particles_decayed_natural += int(n_decays.sum())
+
+    def next_reaction_events(self, state, adjusted_timestep):
+        """Advance decays and interactions event by event with the next-reaction method.
+
+        Returns the simulated time actually covered, which is shorter than the
+        timestep only when max_events was reached.
+        """
+        if state.next_reaction is None:
+            state.next_reaction = NextReactionEngine(self.reaction_network(), state.rng)
+        next_reaction = state.next_reaction
+        if next_reaction.time != state.time_steps:
+            # Another scheme or a reset moved the clock; decays are memoryless so redraw all firing times
+            next_reaction.reset(state.particle_counts, state.time_steps, state.volume)
+
+        decays, interactions, delta = next_reaction.advance(state.particle_counts, state.time_steps + adjusted_timestep,
+                                                            state.volume, self.max_events)
+        self.apply_delta(state, delta)
+        state.total_particles_decayed_natural += decays
+        state.total_particles_decayed_interaction += interactions
+        return next_reaction.time - state.time_steps
+
+    def reaction_network(self):
+        """The reaction list of the next-reaction engine, compiled once per Engine."""
+        if self.reactions is None:
+            self.reactions = compile_reaction_network(interaction_rate=self.interaction_rate)
+        return self.reactions
+
+    def spatial_model(self):
+        """The particle model of "Spatial" kinetics, built once per Engine."""
+        if self.spatial is None:
+            self.spatial = SpatialModel(self, self.interaction_radius, self.particle_speed)
+        return self.spatial
+
+    def handle_interactions(self, state, adjusted_timestep, kinetics=KINETICS):
+        """Handle particle interactions.
+
+        The channels the active index reports as enabled are handled at once through
+        the compiled stoichiometry matrices; channels missing a reactant cost nothing.
+        In "Tau-Leap" kinetics each channel fires Poisson(a * dt) times with the same
+        mass-action propensities a as the next-reaction engine (their combinatorial
+        factors are cached and only recomputed after a reactant count changed);
+        otherwise every enabled channel fires at most once with a 1% chance per step.
+        """
+        # Only channels whose reactants are all present can fire
+        enabled = state.active.enabled_channels()
+        if enabled.size == 0:
+            return
+        rng, counts, reactants = state.rng, state.particle_counts, self.reactants
+        if kinetics == "Tau-Leap":
+            propensities = self.interaction_rate * state.active.mass_action_of(enabled) / state.volume ** (self.order[enabled] - 1)
+            firings = rng.poisson(propensities * adjusted_timestep)
         else:
-            action = "create"
-    
-    return particle_type, action
-
-
-def simulate_vacuum_energy(adjusted_timestep):
-    """Simulates particle interactions."""
-    global total_energy, entropy, temperature, time_steps, total_particles_created, total_particles_decayed_interaction, total_particles_decayed_natural, VOLUME, particle_counts, total_particle_count, total_particle_counts
-
-    # Particle creation/annihilation
-    particle_type, action = decide_particle_action() #= random.choice(list(PARTICLES.keys()))
-    #action = random.choice(["create", "annihilate"])
-    if action == "create":
-        particle_counts[particle_type] += 1
-        total_particles_created += 1
-        total_particle_count += 1
-    elif action == "annihilate" and particle_counts[particle_type] > 0:
-        particle_counts[particle_type] -= 1
-        total_particle_count -= 1
-        total_particles_decayed_interaction += 1
-
-    # Handle particle decay
-    for particle, count in list(particle_counts.items()):
-        if count > 0 and PARTICLES[particle]["lifetime"] < 1e30:
-            if random.random() < adjusted_timestep / PARTICLES[particle]["lifetime"]:
-                total_particles_decayed_natural = decay_particle(particle)
-
-        # Handle interactions
-        total_particles_decayed_interaction = handle_interactions()
-
-        # Calculate energy and temperature
-        current_energy = sum(zero_point_energy(PARTICLES[p]["mass"]) * count for p, count in particle_counts.items())
-        total_energy += current_energy
-        total_particle_count = sum(particle_counts.values())
-        if total_particle_count > 0:
-            temperature = total_energy / (total_particle_count * k_b * VOLUME)
+            firings = (rng.random(enabled.size) < 0.01).astype(np.int64)
+        hit = np.flatnonzero(firings)
+        if hit.size == 0:
+            return
+        fired, firings = enabled[hit], firings[hit]
+
+        # Scale back channels that would together consume more of a reactant than exists
+        demand = reactants.species_totals(firings, fired)
+        if (demand > counts).any():
+            supply = np.where(demand > counts, counts / np.maximum(demand, 1), 1.0)
+            firings = np.floor(firings * reactants.row_min(supply, fired)).astype(np.int64)
+            fired, firings = fired[firings > 0], firings[firings > 0]
+
+        if fired.size:
+            # Split each channel's firings across its product branches
+            branch_counts = rng.multinomial(firings, self.branch_probs[fired])
+            product_rows = np.bincount(self.branch_rows[fired].ravel(), weights=branch_counts.ravel(), minlength=self.products.shape[0])
+            self.apply_delta(state, self.products.species_totals(product_rows) - reactants.species_totals(firings, fired))
+            state.total_particles_decayed_interaction += int(firings.sum())
+
+    def radiation_density(self, state):
+        """Calculate radiation density."""
+        photon_count = state.particle_counts[PHOTON]
+        energy_per_photon = hbar * c / 1e-7  # Assume average photon wavelength of 1e-7 m
+        return photon_count * energy_per_photon / state.volume
+
+    def gravitational_potential_stats(self, state, monte_carlo=False, samples=64):
+        """Return (mean, variance) of the gravitational potential energy.
+
+        The closed form is exact for the uniform distance distribution; the Monte Carlo
+        mode reports the sample mean and variance instead. Results are cached until the
+        particle counts change.
+        """
+        key = (state.counts_version, monte_carlo, samples)
+        if state.potential_cache is None or state.potential_cache[0] != key:
+            if monte_carlo:
+                stats = sampled_pair_potential(MASS, state.particle_counts, samples, state.rng)
+            else:
+                stats = pair_potential_moments(MASS, state.particle_counts)
+            state.potential_cache = (key, stats)
+        return state.potential_cache[1]
+
+    def gravitational_potential(self, state, monte_carlo=False, samples=64):
+        """Calculate gravitational potential energy."""
+        return self.gravitational_potential_stats(state, monte_carlo, samples)[0]
+
+    def decide_particle_action(self, state, adjusted_timestep):
+        """Decides whether to create or annihilate a particle based on its appearance probability and lifetime.
+
+        The species is drawn in proportion to vacuum_prob from VACUUM_TABLE. An existing
+        particle of that species is reabsorbed with the probability that it decays within
+        the simulated step, 1 - exp(-dt/lifetime); otherwise a new one is created.
+        """
+        rng = state.rng
+        particle_type = VACUUM_TABLE.sample(rng)
+        if state.particle_counts[particle_type] > 0 and rng.random() < -np.expm1(-adjusted_timestep / LIFETIME[particle_type]):
+            return particle_type, "annihilate"
+        return particle_type, "create"
+
+    def vacuum_fluctuations(self, state, adjusted_timestep, k):
+        """Apply k vacuum fluctuations in one batch; returns (created, annihilated).
+
+        Same distribution as k calls of decide_particle_action, except that every
+        reabsorption is checked against the counts from before the batch.
+        """
+        counts = state.particle_counts
+        species = VACUUM_TABLE.sample(state.rng, k)
+        reabsorb = (counts[species] > 0) & (state.rng.random(k) < -np.expm1(-adjusted_timestep / LIFETIME[species]))
+        created = np.bincount(species[~reabsorb], minlength=counts.size)
+        annihilated = np.minimum(np.bincount(species[reabsorb], minlength=counts.size), counts)
+        self.apply_delta(state, created - annihilated)
+        return int(created.sum()), int(annihilated.sum())
+
+    def step(self, state, adjusted_timestep, kinetics=KINETICS, fluctuations=fluctuations_per_step):
+        """Advance `state` by one step of adjusted_timestep simulated seconds.
+
+        kinetics selects the decay scheme: "Bernoulli" decays at most one particle per
+        species per step, "Tau-Leap" draws the number of decays of every species at once
+        and "Next Reaction" simulates every decay and interaction event exactly (one
+        Python event at a time, so large timesteps are slow; see NextReactionEngine).
+        "Spatial" moves explicit particles and lets only close pairs interact (see
+        SpatialModel). fluctuations is the number of vacuum creation/annihilation events per step.
+        """
+        profiler = self.profiler
+        profiler.begin_step()
+
+        if kinetics == "Spatial":
+            # Creation, decays and interactions all act on the particles in the box
+            self.spatial_model().step(state, adjusted_timestep, fluctuations)
         else:
-            temperature = 0  # Avoid division by zero
-
+            # Particle creation/annihilation
+            if fluctuations == 1:
+                particle_type, action = self.decide_particle_action(state, adjusted_timestep)
+                if action == "create":
+                    self.change_count(state, particle_type, 1)
+                    state.total_particles_created += 1
+                else:
+                    self.change_count(state, particle_type, -1)
+                    state.total_particles_decayed_interaction += 1
+            else:
+                created, annihilated = self.vacuum_fluctuations(state, adjusted_timestep, fluctuations)
+                state.total_particles_created += created
+                state.total_particles_decayed_interaction += annihilated
+            profiler.lap("creation")
+
+            # Handle particle decay
+            if kinetics == "Next Reaction":
+                # Decays and interactions are both driven by the event queue
+                adjusted_timestep = self.next_reaction_events(state, adjusted_timestep)
+            elif kinetics == "Tau-Leap":
+                self.tau_leap_decays(state, adjusted_timestep)
+            else:
+                rng = state.rng
+                for particle in state.active.decaying_species():
+                    if rng.random() < adjusted_timestep / LIFETIME[particle]:
+                        self.decay_particle(state, particle)
+            profiler.lap("decay")  # Includes the interactions in "Next Reaction" kinetics
+
+            # Handle interactions
+            if kinetics != "Next Reaction":
+                self.handle_interactions(state, adjusted_timestep, kinetics)
+                profiler.lap("interactions")
+
+        # Calculate energy and temperature from the running totals kept by change_count/apply_delta
+        state.total_energy += state.current_energy
+        if state.total_particle_count > 0:
+            state.temperature = state.total_energy / (state.total_particle_count * k_b * state.volume)
+        else:
+            state.temperature = 0  # Avoid division by zero
 
         # Entropy based on particle count
-        entropy += k_b * len(particle_counts) * adjusted_timestep
+        state.entropy += k_b * state.populated_species * adjusted_timestep
 
         # Expand volume in Big Bang mode
-        if MODE == "Big Bang":
-            VOLUME = min(VOLUME + 0.1 * adjusted_timestep, float('inf'))
-
-
-        time_steps += adjusted_timestep
+        if state.mode == "Big Bang":
+            state.volume = min(state.volume + 0.1 * adjusted_timestep, float('inf'))
 
-    return entropy, temperature, total_energy, total_particles_created, total_particles_decayed_interaction, total_particles_decayed_natural, particle_counts, VOLUME, timestep_multiplier, time_steps, total_particle_count, total_particle_counts
+        state.time_steps += adjusted_timestep
+        profiler.lap("energy")
+        profiler.end_step()
+        return state
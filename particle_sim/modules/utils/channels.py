@@ -0,0 +1,105 @@
+import numpy as np
+from modules.utils.species import TABLES, N_SPECIES
+from modules.utils.table_cache import csr_arrays
+
+DENSE_ROWS = 1024  # Matrices with fewer rows answer row subsets from all rows, which is cheaper than gathering entries
+
+
+class StoichiometryMatrix:
+    """Sparse (CSR) matrix of per-row species multiplicities.
+
+    Rows are channels or branches, columns are species IDs. Only the handful of
+    operations the engine needs are implemented, each as one vectorized call.
+    Where a method takes `rows`, only the entries of those rows are gathered and
+    computed on, so the work follows the rows in use rather than the whole matrix;
+    a dense matrix (fewer than DENSE_ROWS rows) computes every row and selects.
+    """
+
+    def __init__(self, rows, n_species=N_SPECIES):
+        self.set_arrays(*csr_arrays(rows), n_species)
+
+    @classmethod
+    def from_arrays(cls, indptr, indices, data, n_species=N_SPECIES):
+        """Wrap already compiled CSR arrays (e.g. from the table cache)."""
+        matrix = cls.__new__(cls)
+        matrix.set_arrays(indptr, indices, data, n_species)
+        return matrix
+
+    def set_arrays(self, indptr, indices, data, n_species):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.data = np.asarray(data, dtype=np.int64)
+        self.shape = (len(self.indptr) - 1, n_species)
+        self.row_ids = np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))  # Row of every stored entry
+        self.row_lengths = np.diff(self.indptr)
+        self.dense = self.shape[0] < DENSE_ROWS
+
+    def row_sums(self, values):
+        """Return sum_s M[r, s] * values[s] for every row r."""
+        return np.bincount(self.row_ids, weights=self.data * values[self.indices], minlength=self.shape[0])
+
+    def row_entries(self, rows):
+        """Stored entry positions of the given sorted, distinct rows and the length of each row."""
+        selected = np.zeros(self.shape[0], dtype=bool)
+        selected[rows] = True
+        return np.flatnonzero(selected[self.row_ids]), self.row_lengths[rows]
+
+    def species_totals(self, row_counts, rows=None):
+        """Return sum_r row_counts[r] * M[r, s] for every species s (i.e. M.T @ row_counts).
+
+        With `rows` (sorted, distinct), row_counts holds one value per listed row and
+        other rows count as zero.
+        """
+        if rows is not None and self.dense:
+            all_counts = np.zeros(self.shape[0], dtype=row_counts.dtype)
+            all_counts[rows] = row_counts
+            row_counts, rows = all_counts, None
+        if rows is None:
+            weights = row_counts[self.row_ids] * self.data
+            return np.bincount(self.indices, weights=weights, minlength=self.shape[1]).astype(np.int64)
+        entries, lengths = self.row_entries(rows)
+        weights = np.repeat(row_counts, lengths) * self.data[entries]
+        return np.bincount(self.indices[entries], weights=weights, minlength=self.shape[1]).astype(np.int64)
+
+    def rows_satisfied(self, counts):
+        """Rows whose every species has at least its multiplicity available."""
+        missing = np.bincount(self.row_ids, weights=counts[self.indices] < self.data, minlength=self.shape[0])
+        return missing == 0
+
+    def _segments(self, rows):
+        """Entry positions and reduceat offsets of sorted, distinct `rows` (all rows if None)."""
+        if rows is None:
+            return slice(None), self.indptr[:-1]
+        entries, lengths = self.row_entries(rows)
+        return entries, np.cumsum(lengths) - lengths
+
+    def row_min(self, values, rows=None):
+        """Minimum of values[s] over the species present in each (non-empty) row."""
+        if rows is not None and self.dense:
+            return self.row_min(values)[rows]
+        entries, offsets = self._segments(rows)
+        return np.minimum.reduceat(values[self.indices[entries]], offsets)
+
+    def mass_action(self, counts, rows=None):
+        """Return prod_s C(counts[s], M[r, s]) for every row (combinatorial propensity factor)."""
+        if rows is not None and self.dense:
+            return self.mass_action(counts)[rows]
+        entries, offsets = self._segments(rows)
+        data = self.data[entries]
+        n = counts[self.indices[entries]].astype(np.float64)
+        factor = np.ones_like(n)
+        for k in range(int(data.max(initial=1))):
+            factor *= np.where(data > k, np.maximum(n - k, 0) / (k + 1), 1.0)
+        return np.multiply.reduceat(factor, offsets)
+
+
+DECAYS = TABLES["decays"]
+DECAY_BRANCH_PROBS = TABLES["decay_branch_probs"]
+DECAY_BRANCH_PRODUCTS = TABLES["decay_branch_products"]
+
+INTERACTION_REACTANTS = StoichiometryMatrix.from_arrays(TABLES["reactants_indptr"], TABLES["reactants_indices"], TABLES["reactants_data"])
+INTERACTION_PRODUCTS = StoichiometryMatrix.from_arrays(TABLES["products_indptr"], TABLES["products_indices"], TABLES["products_data"])
+INTERACTION_BRANCH_ROWS = TABLES["interaction_branch_rows"]
+INTERACTION_BRANCH_PROBS = TABLES["interaction_branch_probs"]
+N_INTERACTIONS = INTERACTION_REACTANTS.shape[0]
+INTERACTION_ORDER = INTERACTION_REACTANTS.row_sums(np.ones(N_SPECIES))  # Number of reactant particles per channel
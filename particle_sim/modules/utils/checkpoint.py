@@ -0,0 +1,81 @@
+import json
+import os
+import numpy as np
+from modules.utils.next_reaction import NextReactionEngine, IndexedPriorityQueue
+from modules.utils.state import SCALARS, INTEGER_SCALARS
+from modules.utils.spatial import ParticleBox
+
+CHECKPOINT_VERSION = 2
+
+
+def save_checkpoint(path, state, **metadata):
+    """Atomically write a SimulationState, including its RNG stream, to an .npz file.
+
+    Extra keyword arguments (e.g. kinetics, step) are stored as JSON metadata and
+    returned by load_checkpoint. The file is written next to `path` and renamed
+    over it, so a crash mid-write never leaves a truncated checkpoint behind.
+    """
+    rng_state, rng_buffer = state.rng.get_state()
+    arrays = {
+        "version": np.array(CHECKPOINT_VERSION),
+        "mode": np.array(state.mode),
+        "scalars": np.array([getattr(state, name) for name in SCALARS], dtype=np.float64),
+        "particle_counts": state.particle_counts,
+        "total_particle_counts": state.total_particle_counts,
+        "rng_state": np.array(json.dumps(rng_state)),
+        "rng_buffer": rng_buffer,
+        "metadata": np.array(json.dumps(metadata)),
+    }
+
+    nr = state.next_reaction
+    if nr is not None:
+        arrays["nr_clock"] = np.array([nr.time, nr.volume], dtype=np.float64)
+        arrays["nr_x"] = np.array(nr.x, dtype=np.int64)
+        arrays["nr_propensities"] = np.array(nr.propensities, dtype=np.float64)
+        arrays["nr_times"] = np.array(nr.queue.times, dtype=np.float64)
+        arrays["nr_heap"] = np.array(nr.queue.heap, dtype=np.int64)
+
+    box = state.particles
+    if box is not None and box.counts_version == state.counts_version:
+        arrays["particles"] = box.particles
+        arrays["box_side"] = np.array(box.side)
+
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(temporary, path)
+
+
+def load_checkpoint(path, engine):
+    """Rebuild the SimulationState written by save_checkpoint for `engine`; returns (state, metadata)."""
+    with np.load(path) as data:
+        if int(data["version"]) != CHECKPOINT_VERSION:
+            raise ValueError(f"{path} is a version {int(data['version'])} checkpoint, expected {CHECKPOINT_VERSION}")
+        state = engine.new_state(str(data["mode"]))
+        if data["particle_counts"].shape != state.particle_counts.shape:
+            raise ValueError(f"{path} was written for {data['particle_counts'].shape[0]} species, "
+                             f"the particle table has {state.particle_counts.shape[0]}")
+
+        for name, value in zip(SCALARS, data["scalars"]):
+            setattr(state, name, int(value) if name in INTEGER_SCALARS else float(value))
+        state.particle_counts[:] = data["particle_counts"]
+        state.total_particle_counts[:] = data["total_particle_counts"]
+        state.active.reset(state.particle_counts)
+
+        state.rng.set_state(json.loads(str(data["rng_state"])), data["rng_buffer"])
+
+        if "nr_clock" in data:
+            nr = NextReactionEngine(engine.reaction_network(), state.rng)
+            nr.time, nr.volume = (float(v) for v in data["nr_clock"])
+            nr.x = data["nr_x"].tolist()
+            nr.propensities = data["nr_propensities"].tolist()
+            nr.queue = IndexedPriorityQueue(data["nr_times"].tolist())
+            nr.queue.heap = data["nr_heap"].tolist()
+            for i, r in enumerate(nr.queue.heap):
+                nr.queue.pos[r] = i
+            state.next_reaction = nr
+
+        if "particles" in data:
+            state.particles = ParticleBox(data["particles"], float(data["box_side"]), state.counts_version)
+
+        return state, json.loads(str(data["metadata"]))
@@ -0,0 +1,263 @@
+import math
+import numpy as np
+from modules.utils.species import SPECIES_ID, N_SPECIES, LIFETIME, UNSTABLE, species_ids
+
+INFINITY = float("inf")
+
+
+class IndexedPriorityQueue:
+    """Binary min-heap of reaction firing times with O(log R) key updates.
+
+    pos[r] tracks where reaction r sits in the heap so a single reaction's time
+    can be changed in place instead of pushing duplicates.
+    """
+
+    def __init__(self, times):
+        self.times = list(times)
+        self.heap = sorted(range(len(self.times)), key=self.times.__getitem__)  # A sorted list is a valid heap
+        self.pos = [0] * len(self.times)
+        for i, r in enumerate(self.heap):
+            self.pos[r] = i
+
+    def top(self):
+        """Return the (reaction, time) pair that fires next."""
+        r = self.heap[0]
+        return r, self.times[r]
+
+    def update(self, r, time):
+        """Change the firing time of reaction r and restore the heap order."""
+        old = self.times[r]
+        self.times[r] = time
+        if time < old:
+            self._sift_up(self.pos[r])
+        elif time > old:
+            self._sift_down(self.pos[r])
+
+    def _sift_up(self, i):
+        heap, pos, times = self.heap, self.pos, self.times
+        r = heap[i]
+        t = times[r]
+        while i > 0:
+            parent = (i - 1) >> 1
+            p = heap[parent]
+            if t >= times[p]:
+                break
+            heap[i] = p
+            pos[p] = i
+            i = parent
+        heap[i] = r
+        pos[r] = i
+
+    def _sift_down(self, i):
+        heap, pos, times = self.heap, self.pos, self.times
+        n = len(heap)
+        r = heap[i]
+        t = times[r]
+        while True:
+            child = 2 * i + 1
+            if child >= n:
+                break
+            c = heap[child]
+            if child + 1 < n and times[heap[child + 1]] < times[c]:
+                child += 1
+                c = heap[child]
+            if t <= times[c]:
+                break
+            heap[i] = c
+            pos[c] = i
+            i = child
+        heap[i] = r
+        pos[r] = i
+
+
+def compile_reaction_network(decay_channels=None, interaction_channels=None, interaction_rate=1.0):
+    """Turn every decay branch and interaction branch into a mass-action reaction.
+
+    Each reaction is (reactants, delta, rate, is_decay) where reactants is a tuple of
+    (species, multiplicity), delta maps species to their net count change and rate is
+    the stochastic rate constant. Branches of one channel share its rate equally.
+    The channel dicts default to the dictionaries, which are only imported here.
+    """
+    if decay_channels is None:
+        from modules.dictionaries.decay_channels import DECAY_CHANNELS as decay_channels
+    if interaction_channels is None:
+        from modules.dictionaries.interaction_channels import INTERACTION_CHANNELS as interaction_channels
+    reactions = []
+
+    def add(reactant_names, product_names, rate, is_decay):
+        reactant_ids, product_ids = species_ids(reactant_names), species_ids(product_names)
+        reactants = tuple((s, reactant_ids.count(s)) for s in sorted(set(reactant_ids)))
+        delta = {}
+        for s in reactant_ids:
+            delta[s] = delta.get(s, 0) - 1
+        for s in product_ids:
+            delta[s] = delta.get(s, 0) + 1
+        reactions.append((reactants, {s: d for s, d in delta.items() if d}, rate, is_decay))
+
+    # Decays: a particle with lifetime tau decays at rate 1/tau, split across branches
+    for parent, branches in decay_channels.items():
+        s = SPECIES_ID[parent]
+        if branches and UNSTABLE[s]:
+            for products in branches:
+                add((parent,), products, 1 / (LIFETIME[s] * len(branches)), True)
+
+    # Interactions: mass-action kinetics with one shared rate constant
+    for reactants, branches in interaction_channels.items():
+        for products in branches:
+            add(reactants, products, interaction_rate / len(branches), False)
+
+    return reactions
+
+
+class NextReactionEngine:
+    """Exact stochastic simulation with the Gibson-Bruck next-reaction method.
+
+    Every reaction holds an absolute firing time in an indexed priority queue.
+    Firing one reaction only recomputes the propensities of reactions that share
+    a species with it (the dependency graph), so each event costs O(log R) rather
+    than a scan over every channel.
+
+    Events are inherently sequential and this loop is plain Python, so throughput
+    is about 5e5 events/s on the shipped network (one core), not millions. Faster
+    exact kinetics would need a compiled event loop, which is out of scope here.
+    "Tau-Leap" kinetics is the high-throughput scheme, at a cost per step that does
+    not grow with the number of events. max_events_per_step bounds how long one
+    "Next Reaction" step can take.
+    """
+
+    def __init__(self, reactions, rng):
+        self.rng = rng  # BufferedRNG supplying the exponential waiting times
+        self.reactions = reactions
+        self.n_reactions = len(reactions)
+        self.reactants = [r[0] for r in reactions]
+        self.deltas = [tuple(r[1].items()) for r in reactions]
+        self.rates = [r[2] for r in reactions]
+        self.is_decay = [r[3] for r in reactions]
+        self.order = [sum(m for _, m in r[0]) for r in reactions]
+
+        # Reactions whose propensity depends on each species
+        by_species = [[] for _ in range(N_SPECIES)]
+        for j, reactants in enumerate(self.reactants):
+            for s, _ in reactants:
+                by_species[s].append(j)
+        self.by_species = by_species
+
+        # Dependency graph: reactions to refresh after reaction j fires (j itself is always redrawn)
+        self.dependents = []
+        for j, delta in enumerate(self.deltas):
+            affected = set()
+            for s, _ in delta:
+                affected.update(by_species[s])
+            affected.discard(j)
+            self.dependents.append(tuple(sorted(affected)))
+
+        self.time = 0.0
+        self.volume = 1.0
+        self.x = [0] * N_SPECIES
+        self.propensities = [0.0] * self.n_reactions
+        self.queue = IndexedPriorityQueue([INFINITY] * self.n_reactions)
+
+    def propensity(self, j):
+        """Mass-action propensity of reaction j for the current counts and volume."""
+        a = self.rates[j]
+        x = self.x
+        for s, m in self.reactants[j]:
+            n = x[s]
+            if n < m:
+                return 0.0
+            if m == 1:
+                a *= n
+            else:
+                a *= math.comb(n, m)
+        if self.order[j] > 1:
+            a /= self.volume ** (self.order[j] - 1)
+        return a
+
+    def reset(self, counts, time, volume):
+        """Load counts and draw fresh firing times for every reaction."""
+        self.time = time
+        self.volume = volume
+        self.x = [int(n) for n in counts]
+        times = []
+        for j in range(self.n_reactions):
+            a = self.propensity(j)
+            self.propensities[j] = a
+            times.append(time + self.rng.expovariate(a) if a > 0 else INFINITY)
+        self.queue = IndexedPriorityQueue(times)
+
+    def _refresh(self, j):
+        """Recompute reaction j's propensity and rescale its pending firing time."""
+        a_old = self.propensities[j]
+        a_new = self.propensity(j)
+        if a_new == a_old:
+            return
+        self.propensities[j] = a_new
+        if a_new == 0:
+            t = INFINITY
+        elif a_old == 0:
+            t = self.time + self.rng.expovariate(a_new)
+        else:
+            t = self.time + (a_old / a_new) * (self.queue.times[j] - self.time)
+        self.queue.update(j, t)
+
+    def _sync(self, counts, volume):
+        """Absorb count changes made outside the engine (e.g. particle creation)."""
+        x = self.x
+        stale = set()
+        for s in range(N_SPECIES):
+            n = int(counts[s])
+            if n != x[s]:
+                x[s] = n
+                stale.update(self.by_species[s])
+        if volume != self.volume:
+            self.volume = volume
+            stale.update(j for j in range(self.n_reactions) if self.order[j] > 1)
+        for j in stale:
+            self._refresh(j)
+
+    def advance(self, counts, t_end, volume, max_events=INFINITY):
+        """Fire reactions until t_end (or max_events).
+
+        Returns (decays, interactions, delta) where delta is the per-species count
+        change for the caller to apply. If the event budget runs out first, the
+        engine's clock stops at the last event, which may be before t_end.
+        """
+        self._sync(counts, volume)
+        x, deltas, dependents, is_decay = self.x, self.deltas, self.dependents, self.is_decay
+        heap, times, update = self.queue.heap, self.queue.times, self.queue.update
+        propensity, propensities = self.propensity, self.propensities
+        expovariate = self.rng.expovariate
+        decays = interactions = 0
+
+        while decays + interactions < max_events:
+            j = heap[0]
+            t = times[j]
+            if t > t_end:
+                self.time = t_end
+                break
+            self.time = t
+            for s, d in deltas[j]:
+                x[s] += d
+
+            # Rescale the pending times of dependent reactions (inlined _refresh)
+            for k in dependents[j]:
+                a_old = propensities[k]
+                a_new = propensity(k)
+                if a_new != a_old:
+                    propensities[k] = a_new
+                    if a_new == 0:
+                        update(k, INFINITY)
+                    elif a_old == 0:
+                        update(k, t + expovariate(a_new))
+                    else:
+                        update(k, t + (a_old / a_new) * (times[k] - t))
+
+            a = propensity(j)
+            propensities[j] = a
+            update(j, t + expovariate(a) if a > 0 else INFINITY)
+            if is_decay[j]:
+                decays += 1
+            else:
+                interactions += 1
+
+        return decays, interactions, np.array(x, dtype=np.int64) - counts
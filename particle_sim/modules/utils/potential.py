@@ -0,0 +1,57 @@
+import numpy as np
+
+# Self-contained on purpose: the root scripts import this as particle_sim.modules.utils.potential
+
+G = 6.67430e-11  # Gravitational constant (m^3/kg/s^2)
+
+# Pair distances are drawn uniformly from [PAIR_DISTANCE_MIN, PAIR_DISTANCE_MAX] (m)
+PAIR_DISTANCE_MIN, PAIR_DISTANCE_MAX = 1e-10, 1e-3
+INVERSE_DISTANCE_MEAN = np.log(PAIR_DISTANCE_MAX / PAIR_DISTANCE_MIN) / (PAIR_DISTANCE_MAX - PAIR_DISTANCE_MIN)  # E[1/r]
+INVERSE_DISTANCE_VAR = 1 / (PAIR_DISTANCE_MIN * PAIR_DISTANCE_MAX) - INVERSE_DISTANCE_MEAN ** 2  # Var[1/r]
+
+
+def pair_potential_moments(masses, counts):
+    """Mean and variance of -G * sum_{i != j} m_i m_j c_i c_j / r_ij over random distances.
+
+    The pair weights are never formed: sum_{i != j} w_i w_j = (sum w)^2 - sum w^2
+    with w = m * c, and the same identity on w^2 gives the variance, so the cost
+    is O(S) rather than O(S^2).
+    """
+    w = masses * counts
+    w2 = w * w
+    mean = -G * (w.sum() ** 2 - w2.sum()) * INVERSE_DISTANCE_MEAN
+    variance = G ** 2 * (w2.sum() ** 2 - (w2 * w2).sum()) * INVERSE_DISTANCE_VAR
+    return float(mean), float(variance)
+
+
+def sampled_pair_potential(masses, counts, samples, rng):
+    """Monte Carlo estimate: draw every pair distance for `samples` realizations in one call."""
+    present = np.flatnonzero(counts)
+    w = masses[present] * counts[present]
+    weights = np.outer(w, w)
+    np.fill_diagonal(weights, 0)  # A species does not pair with itself
+    r = rng.uniform(PAIR_DISTANCE_MIN, PAIR_DISTANCE_MAX, size=(samples,) + weights.shape)
+    totals = -G * (weights / r).sum(axis=(1, 2))
+    return float(totals.mean()), float(totals.var(ddof=1)) if samples > 1 else 0.0
+
+
+class CachedPairPotential:
+    """Expected pair potential of a name -> count mapping, recomputed only when its version changes.
+
+    The masses are fixed at construction in `names` order; the caller bumps a
+    version counter whenever it changes a count, so a display that redraws
+    every frame pays one comparison until the counts actually move.
+    """
+
+    def __init__(self, names, masses):
+        self.names = tuple(names)
+        self.masses = np.asarray(masses, dtype=float)
+        self.version = None
+        self.value = 0.0
+
+    def __call__(self, counts, version):
+        if version != self.version:
+            vector = np.fromiter((counts.get(name, 0) for name in self.names), dtype=float, count=len(self.names))
+            self.value = pair_potential_moments(self.masses, vector)[0]
+            self.version = version
+        return self.value
@@ -0,0 +1,129 @@
+import contextlib
+import cProfile
+import csv
+import json
+from time import perf_counter_ns
+
+NO_PHASE = contextlib.nullcontext()
+
+
+class PhaseProfiler:
+    """Per-phase wall-clock accumulators for the simulation step and its consumers.
+
+    The step is timed with laps: begin_step() starts the clock and every lap(phase)
+    charges the time since the previous lap to that phase. Coarser sections (the
+    potential in a snapshot, a rendered frame) use `with profiler.phase(name)`.
+    Each phase keeps a total, a call count and an exponential moving average over
+    roughly `window` calls. While disabled, begin_step/lap/end_step are no-op
+    methods and phase() returns a shared null context, so the engine pays one
+    empty call per lap.
+
+    With a pstats path, cProfile runs for the steps in [start, stop) of the
+    profiler's own step count and the stats are written when the window closes,
+    or by close() (also called by disable()) when the run ends inside it.
+    """
+
+    def __init__(self, window=100, pstats=None, pstats_steps=(0, 100)):
+        self.alpha = 2 / (window + 1)
+        self.pstats = pstats
+        self.pstats_steps = pstats_steps
+        self.cprofile = None
+        self.enabled = False
+        self.clear()
+        self.disable()
+
+    def clear(self):
+        self.steps = 0
+        self.last = 0
+        self.total_ns = {}
+        self.calls = {}
+        self.rolling_ns = {}
+
+    def enable(self):
+        self.enabled = True
+        self.begin_step = self._begin_step
+        self.lap = self._lap
+        self.end_step = self._end_step
+
+    def disable(self):
+        self.enabled = False
+        self.begin_step = self.lap = self.end_step = _ignore
+        self.close()
+
+    def close(self):
+        """Stop an open cProfile window and write what it has collected to the pstats path."""
+        if self.cprofile:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(self.pstats)
+            self.cprofile = None
+
+    def record(self, phase, elapsed_ns):
+        """Charge elapsed_ns to phase."""
+        self.total_ns[phase] = self.total_ns.get(phase, 0) + elapsed_ns
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+        average = self.rolling_ns.get(phase)
+        self.rolling_ns[phase] = elapsed_ns if average is None else average + (elapsed_ns - average) * self.alpha
+
+    def _begin_step(self):
+        if self.pstats and self.steps == self.pstats_steps[0]:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        self.last = perf_counter_ns()
+
+    def _lap(self, phase):
+        now = perf_counter_ns()
+        self.record(phase, now - self.last)
+        self.last = now
+
+    def _end_step(self):
+        self.steps += 1
+        if self.steps == self.pstats_steps[1]:
+            self.close()
+
+    def phase(self, name):
+        """Context manager timing one section as `name` (a null context while disabled)."""
+        return self._timed(name) if self.enabled else NO_PHASE
+
+    @contextlib.contextmanager
+    def _timed(self, name):
+        start = perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(name, perf_counter_ns() - start)
+
+    def summary(self):
+        """One row per phase: calls, total ms, mean and rolling µs per call and share of all time."""
+        # Copied in the reverse of record()'s write order, since another thread may add a phase meanwhile
+        rolling_ns = dict(self.rolling_ns)
+        calls, total_ns = dict(self.calls), dict(self.total_ns)
+        overall = sum(total_ns[phase] for phase in rolling_ns) or 1
+        return [{
+            "phase": phase,
+            "calls": calls[phase],
+            "total_ms": total_ns[phase] / 1e6,
+            "mean_us": total_ns[phase] / calls[phase] / 1e3,
+            "rolling_us": rolling / 1e3,
+            "share": total_ns[phase] / overall,
+        } for phase, rolling in rolling_ns.items()]
+
+    def dump(self, path):
+        """Write the summary as CSV (for a .csv path) or JSON."""
+        rows = self.summary()
+        with open(path, "w", newline="") as f:
+            if path.endswith(".csv"):
+                writer = csv.DictWriter(f, fieldnames=["phase", "calls", "total_ms", "mean_us", "rolling_us", "share"])
+                writer.writeheader()
+                writer.writerows(rows)
+            else:
+                json.dump({"steps": self.steps, "phases": rows}, f, indent=2)
+
+
+def _ignore(*args):
+    pass
+
+
+def parse_step_window(text):
+    """Parse "START:STOP" (or "STOP") into a (start, stop) step window."""
+    start, _, stop = text.rpartition(":")
+    return int(start or 0), int(stop)
@@ -0,0 +1,136 @@
+import json
+import os
+import numpy as np
+from modules.utils.species import SPECIES
+
+RECORDER_VERSION = 1
+
+# Fixed-width columns: one value per recorded step, plus the count vector
+SCALAR_COLUMNS = {
+    "step": np.int64,
+    "time_steps": np.float64,
+    "volume": np.float64,
+    "temperature": np.float64,
+    "entropy": np.float64,
+}
+COUNTS_DTYPE = np.int64
+
+
+def _column_path(path, name):
+    return os.path.join(path, f"{name}.bin")
+
+
+class TimeSeriesRecorder:
+    """Append-only recorder of per-step state into memory-mapped column files.
+
+    A recording is a directory with one raw little-endian file per column
+    (counts is a rows x species matrix) and a meta.json holding the number of
+    valid rows. Files grow by `chunk_rows` rows at a time; meta.json is rewritten
+    on every flush, so after a crash at most the rows since the last chunk are lost.
+    Only every `every`-th step is kept.
+    """
+
+    def __init__(self, path, every=1, chunk_rows=65536, resume_step=None):
+        self.path = path
+        self.every = every
+        self.chunk_rows = chunk_rows
+        self.n_species = len(SPECIES)
+        os.makedirs(path, exist_ok=True)
+
+        meta_path = os.path.join(path, "meta.json")
+        self.rows = 0
+        if resume_step is not None and os.path.exists(meta_path):
+            # Continue an existing recording, dropping rows written after the resumed step
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta["species"] != list(SPECIES):
+                raise ValueError(f"{path} was recorded with a different particle table")
+            self.rows = meta["rows"]
+            self.capacity = meta["capacity"]
+            self._map(self.capacity)
+            self.rows = int(np.searchsorted(self.columns["step"][:self.rows], resume_step, side="right"))
+        else:
+            self.capacity = 0
+            for name in list(SCALAR_COLUMNS) + ["counts"]:
+                open(_column_path(path, name), "wb").close()
+            self._grow()
+
+    def _map(self, capacity):
+        self.columns = {
+            name: np.memmap(_column_path(self.path, name), dtype=dtype, mode="r+", shape=(capacity,))
+            for name, dtype in SCALAR_COLUMNS.items()
+        }
+        self.counts = np.memmap(_column_path(self.path, "counts"), dtype=COUNTS_DTYPE, mode="r+", shape=(capacity, self.n_species))
+
+    def _grow(self):
+        """Extend every column file by one chunk and remap it."""
+        if self.capacity:
+            self.flush()
+        self.capacity += self.chunk_rows
+        for name, dtype in SCALAR_COLUMNS.items():
+            with open(_column_path(self.path, name), "r+b") as f:
+                f.truncate(self.capacity * np.dtype(dtype).itemsize)
+        with open(_column_path(self.path, "counts"), "r+b") as f:
+            f.truncate(self.capacity * self.n_species * np.dtype(COUNTS_DTYPE).itemsize)
+        self._map(self.capacity)
+
+    def record(self, step, time_steps, volume, temperature, entropy, counts):
+        """Append one row if `step` falls on the downsampling grid."""
+        if step % self.every:
+            return
+        if self.rows == self.capacity:
+            self._grow()
+        row = self.rows
+        columns = self.columns
+        columns["step"][row] = step
+        columns["time_steps"][row] = time_steps
+        columns["volume"][row] = volume
+        columns["temperature"][row] = temperature
+        columns["entropy"][row] = entropy
+        self.counts[row] = counts
+        self.rows += 1
+
+    def flush(self):
+        """Write mapped pages to disk and publish the row count."""
+        for column in self.columns.values():
+            column.flush()
+        self.counts.flush()
+        meta = {
+            "version": RECORDER_VERSION,
+            "rows": self.rows,
+            "capacity": self.capacity,
+            "every": self.every,
+            "columns": list(SCALAR_COLUMNS),
+            "species": list(SPECIES),
+        }
+        temporary = os.path.join(self.path, "meta.json.tmp")
+        with open(temporary, "w") as f:
+            json.dump(meta, f)
+        os.replace(temporary, os.path.join(self.path, "meta.json"))
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_time_series(path):
+    """Open a recording read-only; returns (columns, species).
+
+    columns maps every scalar column name and "counts" to a read-only memmap
+    trimmed to the valid rows, so slicing (e.g. columns["counts"][a:b, s]) reads
+    straight from the file without copying.
+    """
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    rows = meta["rows"]
+    columns = {}
+    for name in meta["columns"]:
+        columns[name] = np.memmap(_column_path(path, name), dtype=SCALAR_COLUMNS[name], mode="r", shape=(meta["capacity"],))[:rows]
+    columns["counts"] = np.memmap(_column_path(path, "counts"), dtype=COUNTS_DTYPE, mode="r",
+                                  shape=(meta["capacity"], len(meta["species"])))[:rows]
+    return columns, meta["species"]
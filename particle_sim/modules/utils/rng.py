@@ -0,0 +1,77 @@
+import math
+import numpy as np
+
+# Self-contained on purpose: the root scripts import this as particle_sim.modules.utils.rng
+
+
+class BufferedRNG:
+    """Random number service built on a numpy Generator (PCG64).
+
+    Scalar draws (random, randrange, choice, uniform, expovariate) are popped off
+    a block of `block` uniforms generated at once, so a hot loop pays a list.pop()
+    per draw instead of a Generator call, which is several times slower for one
+    value. Array draws (binomial, multinomial, poisson, random(size)) go straight
+    to the Generator. Runs are reproducible from the seed, and spawn() derives
+    independent substreams for workers.
+    """
+
+    def __init__(self, seed=None, block=4096):
+        self.block = block
+        self.seed(seed)
+
+    def seed(self, seed=None):
+        """Restart the stream from `seed` (an int, a SeedSequence or None for fresh entropy)."""
+        self.seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.generator = np.random.Generator(np.random.PCG64(self.seed_sequence))
+        self.buffer = []  # Unused uniforms, consumed from the end
+
+    def spawn(self, n):
+        """Return n independent BufferedRNG substreams (e.g. one per worker)."""
+        return [BufferedRNG(child, self.block) for child in self.seed_sequence.spawn(n)]
+
+    def refill(self):
+        self.buffer[:] = self.generator.random(self.block).tolist()
+
+    def random(self, size=None):
+        """A uniform float in [0, 1); an array of them if size is given."""
+        if size is not None:
+            return self.generator.random(size)
+        buffer = self.buffer
+        if not buffer:
+            self.refill()
+        return buffer.pop()
+
+    def randrange(self, n):
+        return int(self.random() * n)
+
+    def choice(self, seq):
+        return seq[int(self.random() * len(seq))]
+
+    def uniform(self, low, high, size=None):
+        if size is not None:
+            return self.generator.uniform(low, high, size)
+        return low + (high - low) * self.random()
+
+    def expovariate(self, rate):
+        buffer = self.buffer
+        if not buffer:
+            self.refill()
+        return -math.log(1.0 - buffer.pop()) / rate
+
+    def binomial(self, n, p):
+        return self.generator.binomial(n, p)
+
+    def multinomial(self, n, pvals):
+        return self.generator.multinomial(n, pvals)
+
+    def poisson(self, lam):
+        return self.generator.poisson(lam)
+
+    def get_state(self):
+        """Return (bit generator state dict, unused buffered uniforms) for a checkpoint."""
+        return self.generator.bit_generator.state, np.array(self.buffer, dtype=np.float64)
+
+    def set_state(self, state, buffered):
+        """Restore a state returned by get_state()."""
+        self.generator.bit_generator.state = state
+        self.buffer[:] = np.asarray(buffered, dtype=np.float64).tolist()
@@ -0,0 +1,348 @@
+import numpy as np
+from modules.utils.species import TABLES, LIFETIME
+from modules.utils.channels import DECAY_BRANCH_PROBS, DECAY_BRANCH_PRODUCTS
+from modules.utils.alias import AliasTable
+
+# One record per particle; the fields are used as (N,) and (N, 3) views
+PARTICLE_DTYPE = np.dtype([("species", np.int64), ("position", np.float64, (3,)), ("velocity", np.float64, (3,))])
+# The cell itself plus the 13 neighbour offsets of the upper half shell, so each pair of cells is visited once
+HALF_SHELL = np.array([(0, 0, 0)] + [(x, y, z) for x in (-1, 0, 1) for y in (-1, 0, 1) for z in (-1, 0, 1)
+                                     if (x, y, z) > (0, 0, 0)], dtype=np.int64)
+VACUUM_TABLE = AliasTable.from_arrays(TABLES["vacuum_alias_prob"], TABLES["vacuum_alias"])
+
+
+def new_particles(species, positions, velocities):
+    """Pack per-particle arrays into a PARTICLE_DTYPE array."""
+    particles = np.empty(len(species), dtype=PARTICLE_DTYPE)
+    particles["species"] = species
+    particles["position"] = positions
+    particles["velocity"] = velocities
+    return particles
+
+
+class ParticleBox:
+    """Explicit particles in a periodic cube of side `side` (m).
+
+    counts_version is the SimulationState.counts_version the particles were last
+    synced with; when the counts were changed by anything else (a reset, another
+    kinetics, a checkpoint of an older run) the box is rebuilt from the counts.
+    """
+
+    def __init__(self, particles, side, counts_version=0):
+        self.particles = particles
+        self.side = side
+        self.counts_version = counts_version
+
+    @classmethod
+    def from_counts(cls, counts, side, rng, speed, counts_version=0):
+        """Place count[s] particles of every species s uniformly in the box with thermal velocities."""
+        species = np.repeat(np.arange(counts.size), counts)
+        positions = rng.uniform(0.0, side, size=(species.size, 3))
+        return cls(new_particles(species, positions, rng.generator.normal(0.0, speed, size=(species.size, 3))),
+                   side, counts_version)
+
+    def resize(self, side):
+        """Stretch every position with the box, as the Hubble flow does."""
+        if side != self.side:
+            self.particles["position"] *= side / self.side
+            self.side = side
+
+    def drift(self, dt):
+        """Move every particle along its velocity, wrapping around the periodic boundaries."""
+        positions = self.particles["position"]
+        positions += self.particles["velocity"] * dt
+        outside = (positions < 0) | (positions >= self.side)  # Usually few, so only those are wrapped
+        positions[outside] = np.mod(positions[outside], self.side)
+
+    def species_counts(self, n_species):
+        return np.bincount(self.particles["species"], minlength=n_species)
+
+
+def neighbor_pairs(positions, side, radius, species=None, pair_table=None):
+    """Index pairs (i, j), i != j, of particles closer than `radius` in a periodic box.
+
+    A uniform cell list is rebuilt on every call: each particle's cell is found
+    arithmetically and the particles are sorted by cell, then for every offset of
+    the half shell the pairs between each cell and its neighbour are expanded
+    with np.repeat and filtered by their minimum-image distance, one coordinate
+    array at a time. Cells are at least `radius` wide and at most about one per
+    particle, so the candidate pairs grow linearly with N at fixed density.
+    Below three cells per axis the whole box is one cell (all pairs are tested),
+    so keep `radius` under a third of the box side for large N.
+
+    With per-particle `species` and a boolean (S, S) `pair_table`, candidates
+    whose species pair is not marked are dropped before the distance test,
+    which is most of them when few species pairs can react.
+    """
+    n = len(positions)
+    if n < 2:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    n_cells = int(min(side // radius, np.ceil(np.cbrt(n))))
+    offsets = HALF_SHELL
+    if n_cells < 3:
+        n_cells, offsets = 1, HALF_SHELL[:1]  # Wrapped neighbours would repeat cells
+    xyz = np.minimum((positions * (n_cells / side)).astype(np.int32), n_cells - 1)
+    cell = (xyz[:, 0] * n_cells + xyz[:, 1]) * n_cells + xyz[:, 2]
+    order = np.argsort(cell)
+    cell, x, y, z = cell[order], xyz[order, 0], xyz[order, 1], xyz[order, 2]
+    coordinates = [positions[order, axis] for axis in range(3)]  # Contiguous, so the pair gathers are 1-D
+    if pair_table is not None:
+        species = species[order]
+    cell_counts = np.bincount(cell, minlength=n_cells ** 3)
+    cell_start = np.cumsum(cell_counts) - cell_counts
+    # Cell coordinate c + offset + 1 -> wrapped coordinate, pre-multiplied by each axis' stride
+    wrap_z = (np.arange(-1, n_cells + 1) % n_cells).astype(np.int32)
+    wrap_y = wrap_z * n_cells
+    wrap_x = wrap_y * n_cells
+    particles = np.arange(n)
+    radius2 = radius * radius
+
+    first, second = [], []
+    for dx, dy, dz in offsets:
+        neighbor = wrap_x[x + (dx + 1)] + wrap_y[y + (dy + 1)] + wrap_z[z + (dz + 1)] if dx or dy or dz else cell
+        k = cell_counts[neighbor]  # Candidates of every (sorted) particle in that neighbour cell
+        ends = np.cumsum(k)
+        i = np.repeat(particles, k)
+        j = np.arange(ends[-1]) + np.repeat(cell_start[neighbor] - ends + k, k)
+        if not (dx or dy or dz):
+            keep = j > i  # Pairs within a cell once, and never a particle with itself
+            i, j = i[keep], j[keep]
+        if pair_table is not None:
+            keep = pair_table[species[i], species[j]]
+            i, j = i[keep], j[keep]
+        r2 = np.zeros(i.size)
+        for p in coordinates:
+            d = np.abs(p[i] - p[j])
+            np.minimum(d, side - d, out=d)  # Minimum image
+            d *= d
+            r2 += d
+        close = r2 < radius2
+        first.append(i[close])
+        second.append(j[close])
+    return order[np.concatenate(first)], order[np.concatenate(second)]
+
+
+def padded_rows(row_ids, species, n_rows):
+    """(n_rows, width) table of the species IDs listed for each row, padded with -1."""
+    order = np.argsort(row_ids, kind="stable")
+    row_ids, species = row_ids[order], species[order]
+    lengths = np.bincount(row_ids, minlength=n_rows)
+    table = np.full((n_rows, max(int(lengths.max(initial=0)), 1)), -1, dtype=np.int64)
+    table[row_ids, np.arange(row_ids.size) - np.repeat(np.cumsum(lengths) - lengths, lengths)] = species
+    return table
+
+
+class ChannelLookup:
+    """Channels keyed by an integer (a species ID, or a*S + b for a pair), several per key allowed."""
+
+    def __init__(self, keys, channels):
+        order = np.argsort(keys, kind="stable")
+        self.keys, counts = np.unique(keys[order], return_counts=True)
+        self.channels = channels[order]
+        self.start = np.cumsum(counts) - counts
+        self.count = counts
+
+    def find(self, keys):
+        """Position of each key in the lookup and whether it has channels at all (the lookup must not be empty)."""
+        position = np.minimum(np.searchsorted(self.keys, keys), self.keys.size - 1)
+        return position, self.keys[position] == keys
+
+    def pick(self, position, u):
+        """One channel of each key, uniformly among its channels, from uniforms u."""
+        return self.channels[self.start[position] + (u * self.count[position]).astype(np.int64)]
+
+
+class SpatialModel:
+    """Particles with positions and velocities for an Engine's network ("Spatial" kinetics).
+
+    Each step the particles drift (with periodic boundaries) and the box follows
+    the state's volume, which stretches positions like the Hubble flow. Unstable
+    particles decay with probability 1 - exp(-dt/lifetime) and their products
+    start at the parent's position. One-reactant channels fire per particle with
+    probability 1 - exp(-k*dt). Two-reactant channels only fire for pairs within
+    `radius` of each other, found through neighbor_pairs(): a pair reacts with
+    probability k*dt / (4/3 pi radius^3), capped at 1, which matches mass action
+    k*n_a*n_b/V when the particles are well mixed, but follows the local density
+    otherwise. A particle takes part in at most one reaction per step, and
+    three-body channels are not simulated. The counts of the state are
+    recomputed from the particles after every step.
+    """
+
+    def __init__(self, engine, radius, speed):
+        self.engine = engine
+        self.radius = radius
+        self.speed = speed
+        reactants, products = engine.reactants, engine.products
+        self.n_species = reactants.shape[1]
+        reactant_ids = padded_rows(np.repeat(reactants.row_ids, reactants.data), np.repeat(reactants.indices, reactants.data),
+                                   reactants.shape[0])
+        channels = np.arange(reactants.shape[0])
+        unary = engine.order == 1
+        binary = engine.order == 2
+        self.unary = ChannelLookup(reactant_ids[unary, 0], channels[unary])
+        self.binary = ChannelLookup(reactant_ids[binary, 0] * self.n_species + reactant_ids[binary, 1], channels[binary])
+        self.pair_table = np.zeros((self.n_species, self.n_species), dtype=bool)  # Species pairs with a channel
+        self.pair_table[reactant_ids[binary, 0], reactant_ids[binary, 1]] = True
+        self.pair_table |= self.pair_table.T
+        self.branch_cdf = np.cumsum(engine.branch_probs, axis=1)
+        self.product_ids = padded_rows(np.repeat(products.row_ids, products.data), np.repeat(products.indices, products.data),
+                                       products.shape[0])
+
+        # Decay products of every (species, branch), padded like product_ids
+        parents, branches, product = np.nonzero(DECAY_BRANCH_PRODUCTS)
+        multiplicity = DECAY_BRANCH_PRODUCTS[parents, branches, product]
+        n_branches = DECAY_BRANCH_PRODUCTS.shape[1]
+        self.decay_branch_cdf = np.cumsum(DECAY_BRANCH_PROBS, axis=1)
+        self.decay_ids = padded_rows(np.repeat(parents * n_branches + branches, multiplicity), np.repeat(product, multiplicity),
+                                     DECAY_BRANCH_PRODUCTS.shape[0] * n_branches).reshape(DECAY_BRANCH_PRODUCTS.shape[0], n_branches, -1)
+
+    def box(self, state):
+        """The particles of `state`, (re)built from its counts when they are out of sync."""
+        side = state.volume ** (1 / 3)
+        box = state.particles
+        if box is None or box.counts_version != state.counts_version:
+            box = state.particles = ParticleBox.from_counts(state.particle_counts, side, state.rng, self.speed, state.counts_version)
+        box.resize(side)
+        return box
+
+    def offspring(self, ids, positions, velocities, rng):
+        """Particles for the padded product rows `ids` of parents at `positions` moving with `velocities`."""
+        parent, slot = np.nonzero(ids >= 0)
+        kicks = rng.generator.normal(0.0, self.speed, size=(parent.size, 3))
+        return new_particles(ids[parent, slot], positions[parent], velocities[parent] + kicks)
+
+    def vacuum_fluctuations(self, state, box, alive, born, dt, k):
+        """k creations/reabsorptions as in Engine.vacuum_fluctuations, placing or removing particles."""
+        rng, counts = state.rng, state.particle_counts
+        species = VACUUM_TABLE.sample(rng, k)
+        reabsorb = (counts[species] > 0) & (rng.random(species.size) < -np.expm1(-dt / LIFETIME[species]))
+        created = species[~reabsorb]
+        born.append(new_particles(created, rng.uniform(0.0, box.side, size=(created.size, 3)),
+                                  rng.generator.normal(0.0, self.speed, size=(created.size, 3))))
+        annihilated = 0
+        for s, n in zip(*np.unique(species[reabsorb], return_counts=True)):
+            candidates = np.flatnonzero(box.particles["species"] == s)
+            removed = rng.generator.choice(candidates, size=min(n, candidates.size), replace=False)
+            alive[removed] = False
+            annihilated += removed.size
+        return created.size, annihilated
+
+    def decays(self, state, box, alive, born, dt):
+        """Decay each unstable particle with probability 1 - exp(-dt/lifetime); returns the number decayed."""
+        rng = state.rng
+        p = np.where(self.engine.decays, -np.expm1(-dt / LIFETIME), 0.0)
+        species = box.particles["species"]
+        candidates = np.flatnonzero((p[species] > 0) & alive)  # Not the particles reabsorbed this step
+        decayed = candidates[rng.random(candidates.size) < p[species[candidates]]]
+        if decayed.size:
+            parents = species[decayed]
+            branch = (rng.random(decayed.size)[:, None] >= self.decay_branch_cdf[parents]).sum(axis=1)
+            branch = np.minimum(branch, self.decay_branch_cdf.shape[1] - 1)
+            born.append(self.offspring(self.decay_ids[parents, branch], box.particles["position"][decayed],
+                                       box.particles["velocity"][decayed], rng))
+            alive[decayed] = False
+        return decayed.size
+
+    def react(self, channels, rng):
+        """Padded product IDs of one branch of each fired channel."""
+        branch = (rng.random(channels.size)[:, None] >= self.branch_cdf[channels]).sum(axis=1)
+        branch = np.minimum(branch, self.branch_cdf.shape[1] - 1)
+        return self.product_ids[self.engine.branch_rows[channels, branch]]
+
+    def unary_reactions(self, state, box, alive, born, dt):
+        """Fire one-reactant channels per particle; returns the number fired."""
+        if self.unary.keys.size == 0:
+            return 0
+        rng, rate = state.rng, self.engine.interaction_rate
+        species = box.particles["species"]
+        position, has_channel = self.unary.find(species)
+        candidates = np.flatnonzero(has_channel & alive)
+        position = position[candidates]
+        fired = rng.random(candidates.size) < -np.expm1(-rate * self.unary.count[position] * dt)
+        candidates, position = candidates[fired], position[fired]
+        if candidates.size:
+            channels = self.unary.pick(position, rng.random(candidates.size))
+            born.append(self.offspring(self.react(channels, rng), box.particles["position"][candidates],
+                                       box.particles["velocity"][candidates], rng))
+            alive[candidates] = False
+        return candidates.size
+
+    def binary_reactions(self, state, box, alive, born, dt):
+        """Fire two-reactant channels for close pairs; returns the number fired."""
+        if self.binary.keys.size == 0:
+            return 0
+        rng, particles = state.rng, box.particles
+        species = particles["species"]
+        candidates = np.flatnonzero(alive)
+        i, j = neighbor_pairs(particles["position"][candidates], box.side, self.radius, species[candidates], self.pair_table)
+        i, j = candidates[i], candidates[j]
+        engine = self.engine
+        engine.profiler.lap("neighbors")
+
+        a, b = species[i], species[j]
+        position, has_channel = self.binary.find(np.minimum(a, b) * self.n_species + np.maximum(a, b))
+        i, j, position = i[has_channel], j[has_channel], position[has_channel]
+        probability = engine.interaction_rate * self.binary.count[position] * dt / (4 / 3 * np.pi * self.radius ** 3)
+        fired = rng.random(i.size) < probability
+        i, j, position = i[fired], j[fired], position[fired]
+
+        # Each particle reacts at most once: in random priority order, a pair wins when it comes
+        # first for both of its particles; the winners' other pairs are dropped and the rest retried
+        priority = rng.random(i.size)
+        order = np.argsort(priority)
+        i, j, position = i[order], j[order], position[order]
+        winners = []
+        while i.size:
+            _, first = np.unique(np.column_stack([i, j]).ravel(), return_index=True)  # Ends in priority order
+            won = np.bincount(first // 2, minlength=i.size) == 2
+            winners.append((i[won], j[won], position[won]))
+            taken = np.zeros(alive.size, dtype=bool)
+            taken[i[won]] = taken[j[won]] = True
+            rest = ~(taken[i] | taken[j])
+            i, j, position = i[rest], j[rest], position[rest]
+        i, j, position = (np.concatenate(parts) for parts in zip(*winners)) if winners else (i, j, position)
+
+        if i.size:
+            channels = self.binary.pick(position, rng.random(i.size))
+            positions = particles["position"]
+            d = positions[j] - positions[i]
+            d -= box.side * np.round(d / box.side)
+            midpoints = np.mod(positions[i] + d / 2, box.side)
+            velocities = (particles["velocity"][i] + particles["velocity"][j]) / 2
+            born.append(self.offspring(self.react(channels, rng), midpoints, velocities, rng))
+            alive[i] = alive[j] = False
+        return i.size
+
+    def step(self, state, dt, fluctuations):
+        """Advance the particles of `state` by dt and bring its counts and totals up to date."""
+        engine = self.engine
+        profiler = engine.profiler
+        box = self.box(state)
+        alive = np.ones(len(box.particles), dtype=bool)
+        born = []
+
+        created, annihilated = self.vacuum_fluctuations(state, box, alive, born, dt, fluctuations)
+        state.total_particles_created += created
+        state.total_particles_decayed_interaction += annihilated
+        profiler.lap("creation")
+
+        decayed = self.decays(state, box, alive, born, dt)
+        state.total_particles_decayed_natural += decayed
+        profiler.lap("decay")
+
+        box.drift(dt)
+        profiler.lap("motion")
+
+        unary = self.unary_reactions(state, box, alive, born, dt)
+        binary = self.binary_reactions(state, box, alive, born, dt)
+        state.total_particles_decayed_interaction += unary + binary
+
+        # Every process removes only live particles, so each removal marks a distinct particle
+        removed = alive.size - np.count_nonzero(alive)
+        if removed != annihilated + decayed + unary + 2 * binary:
+            raise RuntimeError(f"{annihilated + decayed + unary + 2 * binary - removed} particles were consumed twice in one step")
+
+        box.particles = np.concatenate([box.particles[alive]] + born)
+        engine.apply_delta(state, box.species_counts(self.n_species) - state.particle_counts)
+        box.counts_version = state.counts_version
+        profiler.lap("interactions")
@@ -0,0 +1,35 @@
+import numpy as np
+from modules.utils.table_cache import load_tables, STABLE_LIFETIME
+
+# Species registry compiled from the PARTICLES table (via the table cache).
+# Every species gets an integer ID; per-species properties live in contiguous
+# arrays indexed by that ID so the engine never hashes names in its hot loops.
+TABLES = load_tables()
+SPECIES = tuple(TABLES["species"].tolist())
+SPECIES_ID = {name: i for i, name in enumerate(SPECIES)}
+N_SPECIES = len(SPECIES)
+
+MASS = TABLES["mass"]
+LIFETIME = TABLES["lifetime"]
+VACUUM_PROB = TABLES["vacuum_prob"]
+UNSTABLE = LIFETIME < STABLE_LIFETIME
+
+
+def species_ids(names):
+    """Translate a sequence of species names into a tuple of IDs."""
+    try:
+        return tuple(SPECIES_ID[name] for name in names)
+    except KeyError as e:
+        raise KeyError(f"Unknown species {e.args[0]!r}; add it to dictionaries/particles.py") from None
+
+
+def new_counts():
+    """Return a zeroed per-species count vector."""
+    return np.zeros(N_SPECIES, dtype=np.int64)
+
+
+def species_view(counts, only_nonzero=True):
+    """Return a name-keyed dict view of a count vector (for display only)."""
+    if only_nonzero:
+        return {SPECIES[i]: int(counts[i]) for i in np.flatnonzero(counts)}
+    return {name: int(count) for name, count in zip(SPECIES, counts)}
@@ -0,0 +1,53 @@
+from modules.constants import MODE, VOLUME, temperature
+
+# Scalar fields saved verbatim in a checkpoint so a resumed run continues bit-for-bit
+SCALARS = (
+    "volume", "total_energy", "current_energy", "temperature", "entropy", "time_steps",
+    "total_particle_count", "populated_species", "total_particles_created",
+    "total_particles_decayed_natural", "total_particles_decayed_interaction",
+)
+INTEGER_SCALARS = {
+    "total_particle_count", "populated_species", "total_particles_created",
+    "total_particles_decayed_natural", "total_particles_decayed_interaction",
+}
+
+
+class SimulationState:
+    """Everything one simulation owns: its counts, running totals, random stream and caches.
+
+    An Engine (modules/utils/calculations.py) only reads its own immutable tables and
+    mutates the state it is handed, so any number of states can be stepped in one
+    process, each with its own BufferedRNG. Build states with Engine.new_state(),
+    which sizes the counts and the ActiveIndex for the engine's network.
+    """
+
+    __slots__ = SCALARS + (
+        "mode", "particle_counts", "total_particle_counts", "counts_version", "potential_cache",
+        "rng", "active", "next_reaction", "particles",
+    )
+
+    def __init__(self, particle_counts, active, rng, mode=MODE, volume=VOLUME, initial_temperature=temperature):
+        self.particle_counts = particle_counts  # Current count per species ID
+        self.total_particle_counts = particle_counts.copy()  # Running sum of counts per species ID
+        self.active = active  # Populated/decaying species and enabled channels
+        self.rng = rng  # Every draw of this simulation
+        self.next_reaction = None  # Next-reaction engine, built on first use
+        self.particles = None  # ParticleBox of "Spatial" kinetics, built on first use
+        self.counts_version = 0  # Bumped on every count change; keys cached results such as the potential
+        self.potential_cache = None
+        self.reset(mode, volume, initial_temperature)
+
+    def reset(self, mode=MODE, volume=VOLUME, initial_temperature=temperature):
+        """Zero the running totals for a fresh run; the counts are cleared by Engine.reset()."""
+        self.mode = mode
+        self.volume = volume
+        self.temperature = initial_temperature
+        self.total_energy = 0.0
+        self.current_energy = 0.0  # Zero-point energy of the current particles, kept up to date by the deltas
+        self.entropy = 0.0
+        self.time_steps = 0
+        self.total_particle_count = 0
+        self.populated_species = 0  # Number of species with a nonzero count
+        self.total_particles_created = 0
+        self.total_particles_decayed_natural = 0
+        self.total_particles_decayed_interaction = 0
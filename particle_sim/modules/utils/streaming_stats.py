@@ -0,0 +1,87 @@
+import numpy as np
+
+
+class RunningMoments:
+    """Element-wise streaming mean and variance (Welford's algorithm).
+
+    Each add() takes one array of the configured shape, e.g. a whole trajectory,
+    so the statistics of many realizations are kept without storing them.
+    """
+
+    def __init__(self, shape):
+        self.n = 0
+        self.mean = np.zeros(shape, dtype=np.float64)
+        self.m2 = np.zeros(shape, dtype=np.float64)
+
+    def add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    @property
+    def variance(self):
+        """Sample variance (ddof=1); zero until two observations were added."""
+        return self.m2 / (self.n - 1) if self.n > 1 else np.zeros_like(self.m2)
+
+
+class P2Quantile:
+    """Element-wise streaming quantile estimate with the P-squared algorithm.
+
+    Five markers per element track the minimum, the p/2, p and (1+p)/2 quantiles
+    and the maximum; marker heights are adjusted with a piecewise-parabolic
+    formula, so memory stays constant no matter how many arrays are added.
+    """
+
+    def __init__(self, p, shape):
+        self.p = p
+        self.n = 0
+        self.heights = np.zeros(tuple(shape) + (5,), dtype=np.float64)
+        self.positions = np.tile(np.arange(1.0, 6.0), tuple(shape) + (1,))
+        self.desired = np.array([1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5], dtype=np.float64)
+        self.increments = np.array([0, p / 2, p, (1 + p) / 2, 1], dtype=np.float64)
+
+    def add(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        if self.n < 5:
+            # The first five observations initialise the markers
+            self.heights[..., self.n] = x
+            self.n += 1
+            if self.n == 5:
+                self.heights.sort(axis=-1)
+            return
+        self.n += 1
+        q, pos = self.heights, self.positions
+
+        # Extend the extreme markers and find the cell k with q[k] <= x < q[k+1]
+        q[..., 0] = np.minimum(q[..., 0], x)
+        q[..., 4] = np.maximum(q[..., 4], x)
+        k = np.clip((x[..., None] >= q[..., 1:4]).sum(axis=-1), 0, 3)
+        pos += np.arange(5) > k[..., None]
+        self.desired += self.increments
+
+        for i in (1, 2, 3):
+            d = self.desired[i] - pos[..., i]
+            move = ((d >= 1) & (pos[..., i + 1] - pos[..., i] > 1)) | ((d <= -1) & (pos[..., i - 1] - pos[..., i] < -1))
+            if not move.any():
+                continue
+            s = np.sign(d)
+            n_lo, n_i, n_hi = pos[..., i - 1], pos[..., i], pos[..., i + 1]
+            q_lo, q_i, q_hi = q[..., i - 1], q[..., i], q[..., i + 1]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                parabolic = q_i + s / (n_hi - n_lo) * (
+                    (n_i - n_lo + s) * (q_hi - q_i) / (n_hi - n_i) + (n_hi - n_i - s) * (q_i - q_lo) / (n_i - n_lo)
+                )
+                neighbour_q = np.where(s > 0, q_hi, q_lo)
+                neighbour_n = np.where(s > 0, n_hi, n_lo)
+                linear = q_i + s * (neighbour_q - q_i) / (neighbour_n - n_i)
+            adjusted = np.where((q_lo < parabolic) & (parabolic < q_hi), parabolic, linear)
+            q[..., i] = np.where(move, adjusted, q_i)
+            pos[..., i] = np.where(move, n_i + s, n_i)
+
+    @property
+    def value(self):
+        """Current quantile estimate (exact while fewer than five arrays were added)."""
+        if self.n < 5:
+            return np.quantile(self.heights[..., :self.n], self.p, axis=-1) if self.n else np.zeros(self.heights.shape[:-1])
+        return self.heights[..., 2].copy()
@@ -0,0 +1,175 @@
+import hashlib
+import importlib.util
+import os
+import numpy as np
+from modules.utils.alias import AliasTable
+
+TABLE_CACHE_VERSION = 1  # Bump when the compiled layout or the compile functions change
+DICTIONARIES = ("modules.dictionaries.particles", "modules.dictionaries.decay_channels", "modules.dictionaries.interaction_channels")
+CACHE_DIR = os.environ.get("PARTICLE_SIM_CACHE", os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), ".cache"))
+STABLE_LIFETIME = 1e30  # Lifetimes of 1e30 s mark stable species
+
+
+def dictionary_hash():
+    """SHA-256 over the source of the dictionary modules (read as files, never imported) and the cache version."""
+    digest = hashlib.sha256(str(TABLE_CACHE_VERSION).encode())
+    for name in DICTIONARIES:
+        with open(importlib.util.find_spec(name).origin, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def validate_channels(particles, decay_channels, interaction_channels):
+    """Raise ValueError listing every channel that refers to a species missing from particles."""
+    problems = []
+    for parent, branches in decay_channels.items():
+        if parent not in particles:
+            problems.append(f"decay of unknown species {parent!r}")
+        for products in branches:
+            problems.extend(f"decay {parent!r} -> {products}: unknown species {name!r}" for name in products if name not in particles)
+    for reactants, branches in interaction_channels.items():
+        problems.extend(f"interaction {reactants}: unknown reactant {name!r}" for name in reactants if name not in particles)
+        for products in branches:
+            problems.extend(f"interaction {reactants} -> {products}: unknown species {name!r}" for name in products if name not in particles)
+    if problems:
+        raise ValueError("Channels refer to species missing from dictionaries/particles.py:\n  " + "\n  ".join(problems))
+
+
+def csr_arrays(rows):
+    """(indptr, indices, data) of per-row species multiplicities, each row's species sorted."""
+    indptr, indices, data = [0], [], []
+    for row in rows:
+        for s in sorted(set(row)):
+            indices.append(s)
+            data.append(row.count(s))
+        indptr.append(len(indices))
+    return np.array(indptr, dtype=np.int64), np.array(indices, dtype=np.int64), np.array(data, dtype=np.int64)
+
+
+def compile_decay_channels(decay_channels, species_id):
+    """Compile a decay channel dict into padded per-species branch tables.
+
+    Returns (decays, branch_probs, branch_products) where decays[s] marks species
+    with at least one branch, branch_probs[s, k] is the probability of branch k and
+    branch_products[s, k] is the product count vector of that branch.
+    """
+    n_species = len(species_id)
+    max_branches = max((len(branches) for branches in decay_channels.values()), default=1)
+    decays = np.zeros(n_species, dtype=bool)
+    branch_probs = np.zeros((n_species, max_branches), dtype=np.float64)
+    branch_products = np.zeros((n_species, max_branches, n_species), dtype=np.int64)
+
+    for parent, branches in decay_channels.items():
+        if not branches:
+            continue  # Stable isotopes are listed with no branches
+        s = species_id[parent]
+        decays[s] = True
+        branch_probs[s, :len(branches)] = 1 / len(branches)  # Branches are equally likely
+        for k, products in enumerate(branches):
+            for product in products:
+                branch_products[s, k, species_id[product]] += 1
+
+    return decays, branch_probs, branch_products
+
+
+def compile_interaction_channels(interaction_channels, species_id):
+    """Compile an interaction channel dict into reactant and product stoichiometry.
+
+    Returns (reactant_rows, product_rows, branch_rows, branch_probs): reactant_rows
+    has one tuple of species IDs per channel, product_rows one per product branch,
+    and branch_rows[c, k] / branch_probs[c, k] give the product row and probability
+    of branch k of channel c (padded with row 0 and probability 0).
+    """
+    reactant_rows, product_rows, channel_branches = [], [], []
+    for reactants, branches in interaction_channels.items():
+        reactant_rows.append(tuple(species_id[name] for name in reactants))
+        channel_branches.append(list(range(len(product_rows), len(product_rows) + len(branches))))
+        product_rows.extend(tuple(species_id[name] for name in products) for products in branches)
+
+    max_branches = max((len(rows) for rows in channel_branches), default=1)
+    branch_rows = np.zeros((len(reactant_rows), max_branches), dtype=np.int64)
+    branch_probs = np.zeros((len(reactant_rows), max_branches), dtype=np.float64)
+    for c, rows in enumerate(channel_branches):
+        branch_rows[c, :len(rows)] = rows
+        branch_probs[c, :len(rows)] = 1 / len(rows)  # Branches are equally likely
+
+    return reactant_rows, product_rows, branch_rows, branch_probs
+
+
+def build_tables():
+    """Evaluate the dictionary modules and compile every table the engine needs into a dict of arrays."""
+    from modules.dictionaries.particles import PARTICLES
+    from modules.dictionaries.decay_channels import DECAY_CHANNELS
+    from modules.dictionaries.interaction_channels import INTERACTION_CHANNELS
+
+    validate_channels(PARTICLES, DECAY_CHANNELS, INTERACTION_CHANNELS)
+    species = tuple(PARTICLES)
+    species_id = {name: i for i, name in enumerate(species)}
+    vacuum_prob = np.array([PARTICLES[name]["vacuum_prob"] for name in species], dtype=np.float64)
+    vacuum_table = AliasTable(vacuum_prob)
+    decays, decay_branch_probs, decay_branch_products = compile_decay_channels(DECAY_CHANNELS, species_id)
+    reactant_rows, product_rows, branch_rows, branch_probs = compile_interaction_channels(INTERACTION_CHANNELS, species_id)
+    reactants_indptr, reactants_indices, reactants_data = csr_arrays(reactant_rows)
+    products_indptr, products_indices, products_data = csr_arrays(product_rows)
+
+    return {
+        "version": np.array(TABLE_CACHE_VERSION),
+        "species": np.array(species),
+        "mass": np.array([PARTICLES[name]["mass"] for name in species], dtype=np.float64),
+        "lifetime": np.array([PARTICLES[name]["lifetime"] for name in species], dtype=np.float64),
+        "vacuum_prob": vacuum_prob,
+        "vacuum_alias_prob": vacuum_table.prob,
+        "vacuum_alias": vacuum_table.alias,
+        "decays": decays,
+        "decay_branch_probs": decay_branch_probs,
+        "decay_branch_products": decay_branch_products,
+        "reactants_indptr": reactants_indptr,
+        "reactants_indices": reactants_indices,
+        "reactants_data": reactants_data,
+        "products_indptr": products_indptr,
+        "products_indices": products_indices,
+        "products_data": products_data,
+        "interaction_branch_rows": branch_rows,
+        "interaction_branch_probs": branch_probs,
+    }
+
+
+def cache_path(digest, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, f"tables-{digest[:16]}.npz")
+
+
+def write_tables(tables, path):
+    """Atomically write compiled tables and drop the artifacts of older dictionary versions."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        np.savez(f, **tables)
+    os.replace(temporary, path)
+    for name in os.listdir(directory):
+        if name.startswith("tables-") and name.endswith(".npz") and os.path.join(directory, name) != path:
+            os.remove(os.path.join(directory, name))
+
+
+def load_tables(cache_dir=CACHE_DIR, rebuild=False):
+    """Return the compiled tables, from the cache when it matches the dictionaries.
+
+    The artifact is named after dictionary_hash(), so editing a dictionary module
+    (or bumping TABLE_CACHE_VERSION) makes the next start rebuild it. An .npz is
+    read lazily, one array per access. When the cache cannot be written (e.g. a
+    read-only install) the freshly built tables are used without caching.
+    """
+    path = cache_path(dictionary_hash(), cache_dir)
+    if not rebuild and os.path.exists(path):
+        try:
+            tables = np.load(path)
+            if int(tables["version"]) == TABLE_CACHE_VERSION:
+                return tables
+        except (OSError, ValueError, KeyError):
+            pass  # Unreadable or partial artifact: rebuild it
+    tables = build_tables()
+    try:
+        write_tables(tables, path)
+    except OSError:
+        pass
+    return tables
@@ -0,0 +1,163 @@
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from galaxy_rotation import EnclosedMass, gas_density_profile, rotation_curve_matrix
+
+# Fitted halo parameters and the default search ranges (log10 of scale radius, rho_0 and central mass)
+PARAMETERS = ("scale_radius", "rho_0", "initial_mass")
+BOUNDS = ((-1.0, 2.0), (3.0, 13.0), (8.0, 18.0))
+SUMMARY_COLUMNS = ("galaxy",) + PARAMETERS + ("chi2", "reduced_chi2", "points", "evaluations", "seconds", "error")
+
+
+# Read an observed rotation curve: CSV rows of radius, velocity, sigma (a header line is skipped)
+def read_rotation_curve(path):
+    with open(path) as f:
+        first = f.readline().split(",")
+    try:
+        [float(value) for value in first]
+        header = 0
+    except ValueError:
+        header = 1
+    data = np.loadtxt(path, delimiter=",", skiprows=header, ndmin=2)
+    if data.shape[1] < 3:
+        raise ValueError(f"{path}: expected columns radius, velocity, sigma")
+    radius, velocity, sigma = data[np.argsort(data[:, 0]), :3].T
+    if np.any(sigma <= 0):
+        raise ValueError(f"{path}: sigma must be positive")
+    return radius, velocity, sigma
+
+
+class RotationCurveFit:
+    """Chi-squared fit of the galaxy_rotation model to one observed rotation curve.
+
+    Parameters are searched as log10 values, so every candidate is positive and
+    the ranges span decades. A coarse grid over BOUNDS is evaluated in one
+    rotation_curve_matrix() call; the best grid point then seeds a Nelder-Mead
+    refinement that treats points outside the bounds as infinitely bad (the
+    halo parameters are degenerate when the halo is weak). chi2() memoizes
+    single evaluations by their parameters, since the simplex revisits points
+    when it contracts and shrinks.
+    """
+
+    def __init__(self, radius, velocity, sigma, gas_mass=0.0):
+        self.radius = radius
+        self.velocity = velocity
+        self.weight = 1 / sigma
+        self.baryon_mass = EnclosedMass(radius).distributed(gas_mass, gas_density_profile) if gas_mass else 0.0
+        self.cache = {}
+
+    def chi2_matrix(self, log_parameters, chunk_size=2 ** 21):
+        """Chi-squared of each row of log10 parameters, broadcast over chunks of about chunk_size model values."""
+        rows = max(1, chunk_size // self.radius.size)
+        chi2 = np.empty(len(log_parameters))
+        for start in range(0, len(log_parameters), rows):
+            model = rotation_curve_matrix(self.radius, *(10.0 ** log_parameters[start:start + rows].T), self.baryon_mass)
+            chi2[start:start + rows] = np.square((model - self.velocity) * self.weight).sum(axis=1)
+        return chi2
+
+    def chi2(self, log_parameters):
+        key = tuple(log_parameters)
+        if key not in self.cache:
+            self.cache[key] = float(self.chi2_matrix(np.array([key]))[0])
+        return self.cache[key]
+
+    def grid_search(self, bounds=BOUNDS, points=24):
+        """Best log10 parameters of a points^3 grid over bounds and the grid spacing per parameter."""
+        axes = [np.linspace(low, high, points) for low, high in bounds]
+        grid = np.stack([axis.ravel() for axis in np.meshgrid(*axes, indexing="ij")], axis=1)
+        return grid[np.argmin(self.chi2_matrix(grid))], np.array([axis[1] - axis[0] for axis in axes])
+
+    def fit(self, bounds=BOUNDS, points=24, max_iterations=2000):
+        start, step = self.grid_search(bounds, points)
+        low, high = np.array(bounds).T
+        best, chi2 = nelder_mead(lambda x: self.chi2(x) if np.all((low <= x) & (x <= high)) else np.inf, start, step, max_iterations)
+        values = 10.0 ** best
+        return dict(zip(PARAMETERS, values.tolist()), chi2=chi2, reduced_chi2=chi2 / max(self.radius.size - len(PARAMETERS), 1),
+                    points=self.radius.size, evaluations=len(self.cache))
+
+
+# Minimize f from x0 with the Nelder-Mead simplex method; returns (x, f(x))
+def nelder_mead(f, x0, step, max_iterations=2000, xtol=1e-6, ftol=1e-10):
+    simplex = np.vstack([x0, x0 + np.diag(step)])
+    values = np.array([f(x) for x in simplex])
+    for _ in range(max_iterations):
+        order = np.argsort(values)
+        simplex, values = simplex[order], values[order]
+        if np.max(np.abs(simplex[1:] - simplex[0])) < xtol or values[-1] - values[0] <= ftol * (abs(values[0]) + ftol):
+            break
+        centroid = simplex[:-1].mean(axis=0)
+        reflected = centroid + (centroid - simplex[-1])
+        f_reflected = f(reflected)
+        if f_reflected < values[0]:
+            expanded = centroid + 2 * (centroid - simplex[-1])
+            f_expanded = f(expanded)
+            simplex[-1], values[-1] = (expanded, f_expanded) if f_expanded < f_reflected else (reflected, f_reflected)
+        elif f_reflected < values[-2]:
+            simplex[-1], values[-1] = reflected, f_reflected
+        else:
+            # Contract towards the better of the worst point and its reflection
+            outside = f_reflected < values[-1]
+            contracted = centroid + 0.5 * ((reflected if outside else simplex[-1]) - centroid)
+            f_contracted = f(contracted)
+            if f_contracted < (f_reflected if outside else values[-1]):
+                simplex[-1], values[-1] = contracted, f_contracted
+            else:
+                simplex[1:] = simplex[0] + 0.5 * (simplex[1:] - simplex[0])  # Shrink towards the best point
+                values[1:] = [f(x) for x in simplex[1:]]
+    best = np.argmin(values)
+    return simplex[best], float(values[best])
+
+
+# Fit one CSV file; failures are reported in the result instead of raised, so a batch keeps going
+def fit_file(task):
+    path, gas_mass, points = task
+    start = time.perf_counter()
+    result = {"galaxy": os.path.splitext(os.path.basename(path))[0]}
+    try:
+        result.update(RotationCurveFit(*read_rotation_curve(path), gas_mass).fit(points=points))
+    except (OSError, ValueError) as e:
+        result["error"] = str(e)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+# Fit every .csv file in a directory across a process pool and write one summary row per galaxy
+def fit_directory(directory, output="fit_summary.csv", workers=None, gas_mass=0.0, points=24, log=print):
+    workers = workers or os.cpu_count()
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".csv"))
+    tasks = [(path, gas_mass, points) for path in paths]
+    start = time.perf_counter()
+    with open(output, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_COLUMNS)
+        writer.writeheader()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for done, result in enumerate(pool.map(fit_file, tasks, chunksize=max(1, len(tasks) // (4 * workers))), 1):
+                writer.writerow(result)
+                if done % max(1, len(tasks) // 10) == 0:
+                    log(f"{done}/{len(tasks)} galaxies | {done / (time.perf_counter() - start):.1f} fits/s")
+    log(f"{len(tasks)} galaxies in {time.perf_counter() - start:.2f}s on {workers} workers, summary in {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit the galaxy_rotation halo model to observed rotation curves (CSV: radius, velocity, sigma)")
+    parser.add_argument("path", help="a CSV file, or a directory of them to fit in parallel")
+    parser.add_argument("--output", default="fit_summary.csv", help="summary table of a directory fit")
+    parser.add_argument("--workers", type=int, default=None, help="processes for a directory fit (default: all cores)")
+    parser.add_argument("--gas-mass", type=float, default=0.0, help="gas mass spread like gas_density_profile")
+    parser.add_argument("--grid-points", type=int, default=24, help="grid points per parameter of the coarse search")
+    args = parser.parse_args()
+
+    if os.path.isdir(args.path):
+        fit_directory(args.path, args.output, args.workers, args.gas_mass, args.grid_points)
+    else:
+        result = fit_file((args.path, args.gas_mass, args.grid_points))
+        for name in SUMMARY_COLUMNS:
+            if name in result:
+                print(f"{name}: {result[name]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
-import random
 import curses
 import time
 import numpy as np
 from collections import defaultdict
+from itertools import islice
+from particle_sim.modules.display.renderer import FrameRenderer
+from particle_sim.modules.utils.potential import CachedPairPotential
+from particle_sim.modules.utils.rng import BufferedRNG
 
 # Constants
 c = 3e8  # Speed of light (m/s)
@@ -48,9 +51,14 @@ INTERACTION_CHANNELS = {
 }
 
 # Simulation Variables
+rng = BufferedRNG()  # Buffered numpy stream for all draws
+PARTICLE_NAMES = tuple(PARTICLES)
+ACTIONS = ("create", "annihilate")
 MODE = "Default"
 VOLUME = 1.0
 particle_counts = defaultdict(int)
+counts_version = 0  # Bumped whenever particle_counts changes
+pair_potential = CachedPairPotential(PARTICLE_NAMES, [PARTICLES[p]["mass"] for p in PARTICLE_NAMES])
 total_energy = 0.0
 temperature = 2.7
 entropy = 0.0
@@ -76,24 +84,26 @@ def relativistic_energy(mass, speed):
 
 def decay_particle(particle):
     """Handle particle decay."""
-    global total_particles_decayed_natural
+    global total_particles_decayed_natural, counts_version
     if particle in DECAY_CHANNELS and particle_counts[particle] > 0:
         particle_counts[particle] -= 1
+        counts_version += 1
         total_particles_decayed_natural += 1
-        for product in random.choice(DECAY_CHANNELS[particle]):
+        for product in rng.choice(DECAY_CHANNELS[particle]):
             particle_counts[product] += 1
 
 
 def handle_interactions():
     """Handle particle interactions."""
-    global total_particles_decayed_interaction
+    global total_particles_decayed_interaction, counts_version
     particle_pairs = list(INTERACTION_CHANNELS.keys())
     for pair in particle_pairs:
         if particle_counts[pair[0]] > 0 and particle_counts[pair[1]] > 0:
-            if random.random() < 0.01:  # Interaction probability
+            if rng.random() < 0.01:  # Interaction probability
                 particle_counts[pair[0]] -= 1
                 particle_counts[pair[1]] -= 1
-                products = random.choice(INTERACTION_CHANNELS[pair])
+                counts_version += 1
+                products = rng.choice(INTERACTION_CHANNELS[pair])
                 for product in products:
                     particle_counts[product] += 1
                 total_particles_decayed_interaction += 1
@@ -109,33 +119,29 @@ def radiation_density():
 
 def gravitational_potential():
     """Calculate gravitational potential energy."""
-    total_potential = 0
-    for p1, c1 in particle_counts.items():
-        for p2, c2 in particle_counts.items():
-            if p1 != p2:
-                r = random.uniform(1e-10, 1e-3)  # Random distance between particles
-                total_potential += -G * PARTICLES[p1]["mass"] * PARTICLES[p2]["mass"] * c1 * c2 / r
-    return total_potential
+    return pair_potential(particle_counts, counts_version)
 
 
 def simulate_vacuum_energy(adjusted_timestep):
     """Simulates particle interactions."""
-    global total_energy, entropy, temperature, time_steps, total_particles_created, total_particles_decayed_interaction, VOLUME
+    global total_energy, entropy, temperature, time_steps, total_particles_created, total_particles_decayed_interaction, VOLUME, counts_version
 
     # Particle creation/annihilation
-    particle_type = random.choice(list(PARTICLES.keys()))
-    action = random.choice(["create", "annihilate"])
+    particle_type = rng.choice(PARTICLE_NAMES)
+    action = rng.choice(ACTIONS)
     if action == "create":
         particle_counts[particle_type] += 1
+        counts_version += 1
         total_particles_created += 1
     elif action == "annihilate" and particle_counts[particle_type] > 0:
         particle_counts[particle_type] -= 1
+        counts_version += 1
         total_particles_decayed_interaction += 1
 
     # Handle particle decay
     for particle, count in list(particle_counts.items()):
         if count > 0 and PARTICLES[particle]["lifetime"] < 1e30:
-            if random.random() < adjusted_timestep / PARTICLES[particle]["lifetime"]:
+            if rng.random() < adjusted_timestep / PARTICLES[particle]["lifetime"]:
                 decay_particle(particle)
 
     # Handle interactions
@@ -161,42 +167,44 @@ def display_simulation(stdscr):
     """Display the simulation."""
     global VOLUME, MODE, time_delay, timestep_multiplier, total_particles_created
 
+    renderer = FrameRenderer(stdscr, fps=20)
     start_time = time.time()
     while True:
         elapsed_time = time.time() - start_time
         adjusted_timestep = timestep_multiplier * time_delay
 
-        stdscr.clear()
-
         # Update the simulation
         simulate_vacuum_energy(adjusted_timestep)
 
-        # Display data
-        stdscr.addstr(0, 0, f"Mode: {MODE}")
-        stdscr.addstr(1, 0, f"Elapsed Earth Time: {elapsed_time:.2f}s | Simulation Timesteps: {int(time_steps)}")
-        stdscr.addstr(2, 0, f"Timestep Multiplier: {timestep_multiplier}x | Effective Timestep: {adjusted_timestep:.2e}s")
-        stdscr.addstr(3, 0, f"Total Particles: {total_particles_created}")
-        stdscr.addstr(4, 0, f"Decayed Naturally: {total_particles_decayed_natural} | Decayed via Interaction: {total_particles_decayed_interaction}")
-        avg_appearance_time = elapsed_time / total_particles_created if total_particles_created > 0 else 0
-        stdscr.addstr(5, 0, f"Average Appearance Time: {avg_appearance_time:.2f}s")
-        stdscr.addstr(6, 0, f"Volume: {VOLUME:.2f} m³ | Temperature: {temperature:.2f} K | Entropy: {entropy:.2f}")
-        stdscr.addstr(7, 0, f"Radiation Density: {radiation_density():.2e} GeV/m³")
-        stdscr.addstr(8, 0, f"Gravitational Potential: {gravitational_potential():.2e} J")
-
-        # Display particle counts
-        row = 10
-        stdscr.addstr(row, 0, f"{'Particle':<15} | {'Count':<10}")
-        row += 1
-        stdscr.addstr(row, 0, "-" * 30)
-        row += 1
-        for particle, count in particle_counts.items():
-            stdscr.addstr(row, 0, f"{particle:<15} | {count:<10}")
+        # Display data, at most fps times per second and only the rows that changed
+        if renderer.due():
+            draw = renderer.line
+            height, width = renderer.begin()
+            draw(0, f"Mode: {MODE}")
+            draw(1, f"Elapsed Earth Time: {elapsed_time:.2f}s | Simulation Timesteps: {int(time_steps)}")
+            draw(2, f"Timestep Multiplier: {timestep_multiplier}x | Effective Timestep: {adjusted_timestep:.2e}s")
+            draw(3, f"Total Particles: {total_particles_created}")
+            draw(4, f"Decayed Naturally: {total_particles_decayed_natural} | Decayed via Interaction: {total_particles_decayed_interaction}")
+            avg_appearance_time = elapsed_time / total_particles_created if total_particles_created > 0 else 0
+            draw(5, f"Average Appearance Time: {avg_appearance_time:.2f}s")
+            draw(6, f"Volume: {VOLUME:.2f} m³ | Temperature: {temperature:.2f} K | Entropy: {entropy:.2f}")
+            draw(7, f"Radiation Density: {radiation_density():.2e} GeV/m³")
+            draw(8, f"Gravitational Potential: {gravitational_potential():.2e} J")
+
+            # Display particle counts; only the rows that fit are formatted
+            row = 10
+            draw(row, f"{'Particle':<15} | {'Count':<10}")
+            row += 1
+            draw(row, "-" * 30)
             row += 1
+            for particle, count in islice(particle_counts.items(), max(0, height - 3 - row)):
+                draw(row, f"{particle:<15} | {count:<10}")
+                row += 1
 
-        # Controls
-        stdscr.addstr(row + 2, 0, "Controls: [M] Toggle Mode  [R] Reset  [+/-] Adjust Timestep  [UP/DOWN/LEFT/RIGHT] Adjust Volume  [Q] Quit")
+            # Controls
+            draw(row + 2, "Controls: [M] Toggle Mode  [R] Reset  [+/-] Adjust Timestep  [UP/DOWN/LEFT/RIGHT] Adjust Volume  [Q] Quit")
 
-        stdscr.refresh()
+            renderer.present()
 
         # Handle input
         stdscr.nodelay(True)
@@ -229,13 +237,14 @@ def display_simulation(stdscr):
 
 def reset_simulation():
     """Reset the simulation."""
-    global VOLUME, total_energy, temperature, entropy, time_steps, particle_counts, total_particles_created, total_particles_decayed_natural, total_particles_decayed_interaction
+    global VOLUME, total_energy, temperature, entropy, time_steps, particle_counts, total_particles_created, total_particles_decayed_natural, total_particles_decayed_interaction, counts_version
     VOLUME = 1 if MODE == "Default" else 0.1
     total_energy = 0.0
     temperature = 2.7 if MODE == "Default" else 1e12
     entropy = 0.0
     time_steps = 0
     particle_counts.clear()
+    counts_version += 1
     total_particles_created = 0
     total_particles_decayed_natural = 0
     total_particles_decayed_interaction = 0
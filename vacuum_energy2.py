@@ -1,8 +1,9 @@
-import random
 import curses
 import time
 import numpy as np
 from collections import defaultdict
+from particle_sim.modules.utils.potential import CachedPairPotential
+from particle_sim.modules.utils.rng import BufferedRNG
 
 # Constants
 c = 3e8  # Speed of light (m/s)
@@ -50,9 +51,14 @@ INTERACTION_CHANNELS = {
 }
 
 # Simulation Variables
+rng = BufferedRNG()  # Buffered numpy stream for all draws
+PARTICLE_NAMES = tuple(PARTICLES)
+ACTIONS = ("create", "annihilate")
 MODE = "Default"
 VOLUME = 1.0
 particle_counts = defaultdict(int)
+counts_version = 0  # Bumped whenever particle_counts changes
+pair_potential = CachedPairPotential(PARTICLE_NAMES, [PARTICLES[p]["mass"] for p in PARTICLE_NAMES])
 total_energy = 0.0
 temperature = 2.7
 entropy = 0.0
@@ -78,50 +84,48 @@ def radiation_density():
     return photon_count * energy_per_photon / VOLUME
 
 def gravitational_potential():
-    total_potential = 0
-    for p1, c1 in particle_counts.items():
-        for p2, c2 in particle_counts.items():
-            if p1 != p2:
-                r = random.uniform(1e-10, 1e-3)
-                total_potential += -G * PARTICLES[p1]["mass"] * PARTICLES[p2]["mass"] * c1 * c2 / r
-    return total_potential
+    return pair_potential(particle_counts, counts_version)
 
 def decay_particle(particle):
-    global total_particles_decayed_natural
+    global total_particles_decayed_natural, counts_version
     if particle in DECAY_CHANNELS and particle_counts[particle] > 0:
         particle_counts[particle] -= 1
+        counts_version += 1
         total_particles_decayed_natural += 1
-        for product in random.choice(DECAY_CHANNELS[particle]):
+        for product in rng.choice(DECAY_CHANNELS[particle]):
             particle_counts[product] += 1
 
 def handle_interactions():
-    global total_particles_decayed_interaction
+    global total_particles_decayed_interaction, counts_version
     particle_pairs = list(INTERACTION_CHANNELS.keys())
     for pair in particle_pairs:
         if particle_counts[pair[0]] > 0 and particle_counts[pair[1]] > 0:
-            if random.random() < 0.01:
+            if rng.random() < 0.01:
                 particle_counts[pair[0]] -= 1
                 particle_counts[pair[1]] -= 1
-                products = random.choice(INTERACTION_CHANNELS[pair])
+                counts_version += 1
+                products = rng.choice(INTERACTION_CHANNELS[pair])
                 for product in products:
                     particle_counts[product] += 1
                 total_particles_decayed_interaction += 1
 
 def simulate_vacuum_energy(adjusted_timestep):
-    global total_energy, entropy, temperature, time_steps, total_particles_created, total_particles_decayed_interaction, VOLUME
+    global total_energy, entropy, temperature, time_steps, total_particles_created, total_particles_decayed_interaction, VOLUME, counts_version
 
-    particle_type = random.choice(list(PARTICLES.keys()))
-    action = random.choice(["create", "annihilate"])
+    particle_type = rng.choice(PARTICLE_NAMES)
+    action = rng.choice(ACTIONS)
     if action == "create":
         particle_counts[particle_type] += 1
+        counts_version += 1
         total_particles_created += 1
     elif action == "annihilate" and particle_counts[particle_type] > 0:
         particle_counts[particle_type] -= 1
+        counts_version += 1
         total_particles_decayed_interaction += 1
 
     for particle, count in list(particle_counts.items()):
         if count > 0 and PARTICLES[particle]["lifetime"] < 1e30:
-            if random.random() < adjusted_timestep / PARTICLES[particle]["lifetime"]:
+            if rng.random() < adjusted_timestep / PARTICLES[particle]["lifetime"]:
                 decay_particle(particle)
 
     handle_interactions()
@@ -202,13 +206,14 @@ def display_simulation(stdscr):
         time.sleep(time_delay)
 
 def reset_simulation():
-    global VOLUME, total_energy, temperature, entropy, time_steps, particle_counts, total_particles_created, total_particles_decayed_natural, total_particles_decayed_interaction
+    global VOLUME, total_energy, temperature, entropy, time_steps, particle_counts, total_particles_created, total_particles_decayed_natural, total_particles_decayed_interaction, counts_version
     VOLUME = 1 if MODE == "Default" else 0.1
     total_energy = 0.0
     temperature = 2.7 if MODE == "Default" else 1e12
     entropy = 0.0
     time_steps = 0
     particle_counts.clear()
+    counts_version += 1
     total_particles_created = 0
     total_particles_decayed_natural = 0
     total_particles_decayed_interaction = 0